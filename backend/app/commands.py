@@ -0,0 +1,65 @@
+from flask import current_app
+from flask.cli import AppGroup
+from database import db
+import click
+
+@click.command('init-db')
+def init_db_command():
+    """Create missing tables (development only; production uses database/init and migrations)"""
+    db.create_all()
+    click.echo('Database tables created')
+
+progress_cli = AppGroup('progress', help='Maintain assessment progress counters.')
+
+@progress_cli.command('rebuild')
+@click.argument('assessment_id', required=False)
+def rebuild_progress_command(assessment_id):
+    """Recompute progress counters for one assessment, or all when omitted"""
+    from app.models.assessment import Assessment
+    from app.utils.progress import rebuild_progress
+
+    if assessment_id:
+        assessment_ids = [assessment_id]
+    else:
+        assessment_ids = [id for (id,) in db.session.query(Assessment.id)]
+
+    for id in assessment_ids:
+        rebuild_progress(id)
+        db.session.commit()
+
+    click.echo(f'Rebuilt progress for {len(assessment_ids)} assessment(s)')
+
+uploads_cli = AppGroup('uploads', help='Maintain uploaded files.')
+
+@uploads_cli.command('sweep')
+@click.option('--grace-seconds', type=int, default=None, help='Minimum time a blob must be unreferenced.')
+def sweep_uploads_command(grace_seconds):
+    """Delete uploaded images no longer referenced by any user data"""
+    from app.utils.storage import sweep_uploads
+
+    if grace_seconds is None:
+        grace_seconds = current_app.config.get('UPLOAD_SWEEP_GRACE', 3600)
+
+    result = sweep_uploads(current_app.config['UPLOAD_FOLDER'], grace_seconds=grace_seconds)
+    click.echo(f"Reconciled {result['reconciled']} reference count(s), deleted {result['deleted']} file(s)")
+
+@uploads_cli.command('variants')
+@click.option('--grace-seconds', type=int, default=300, help='Skip uploads saved more recently than this.')
+def regenerate_variants_command(grace_seconds):
+    """Generate thumbnail/web variants missing after a lost background task"""
+    from app.utils.images import regenerate_missing_variants
+
+    fixed = regenerate_missing_variants(current_app.config['UPLOAD_FOLDER'], grace_seconds=grace_seconds)
+    click.echo(f'Generated variants for {fixed} upload(s)')
+
+changes_cli = AppGroup('changes', help='Maintain the user data change history.')
+
+@changes_cli.command('prune')
+@click.option('--days', type=int, default=None, help='Keep deletions newer than this many days.')
+def prune_changes_command(days):
+    """Delete user data tombstones older than CHANGES_RETENTION_DAYS"""
+    from app.utils.changes import prune_deletions
+
+    removed = prune_deletions(days if days is not None else current_app.config['CHANGES_RETENTION_DAYS'])
+    db.session.commit()
+    click.echo(f'Pruned {removed} deletion(s)')
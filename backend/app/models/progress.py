@@ -0,0 +1,29 @@
+from database import db
+import uuid
+from datetime import datetime
+
+class ProgressCounter(db.Model):
+    __tablename__ = 'progress_counters'
+    
+    id = db.Column(db.Uuid(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    assessment_id = db.Column(db.Uuid(as_uuid=False), db.ForeignKey('assessments.id', ondelete='CASCADE'), nullable=False)
+    scope = db.Column(db.Enum('assessment', 'indicator', 'user', name='progress_scope'), nullable=False)
+    scope_id = db.Column(db.Uuid(as_uuid=False), nullable=False)
+    expected = db.Column(db.Integer, nullable=False, default=0)
+    draft = db.Column(db.Integer, nullable=False, default=0)
+    complete = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # One counter row per assessment, indicator and user within an assessment
+    __table_args__ = (db.UniqueConstraint('assessment_id', 'scope', 'scope_id'),)
+    
+    def to_dict(self):
+        """Convert progress counter to dictionary"""
+        return {
+            'scope': self.scope,
+            'scope_id': self.scope_id,
+            'expected': self.expected,
+            'draft': self.draft,
+            'complete': self.complete,
+            'percentage': round(self.complete * 100.0 / self.expected, 1) if self.expected else 0.0
+        }
@@ -0,0 +1,20 @@
+from database import db
+from datetime import datetime
+
+class UploadBlob(db.Model):
+    __tablename__ = 'upload_blobs'
+    
+    # Content-addressed path relative to the upload folder, e.g. ab/cd/abcd....png
+    path = db.Column(db.String(500), primary_key=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert upload blob to dictionary"""
+        return {
+            'path': self.path,
+            'ref_count': self.ref_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
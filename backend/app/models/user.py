@@ -6,7 +6,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 class User(db.Model):
     __tablename__ = 'users'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(db.Uuid(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
     username = db.Column(db.String(50), unique=True, nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
@@ -34,21 +34,8 @@ class User(db.Model):
         if self.role in ['Admin', 'Moderator']:
             return True
             
-        from app.models.user_data import UserPermission
-        permission = UserPermission.query.filter_by(
-            user_id=self.id,
-            indicator_id=indicator_id
-        ).first()
-        
-        if not permission:
-            return False
-            
-        if permission_type == 'view':
-            return permission.can_view
-        elif permission_type == 'edit':
-            return permission.can_edit
-            
-        return False
+        from app.utils.permissions import check_permission
+        return check_permission(self.id, indicator_id, permission_type)
     
     def to_dict(self):
         """Convert user to dictionary"""
@@ -1,45 +1,60 @@
 from database import db
+from sqlalchemy import DDL, event
 import uuid
 from datetime import datetime
 
 class UserData(db.Model):
     __tablename__ = 'user_data'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-    indicator_item_id = db.Column(db.String(36), db.ForeignKey('indicator_items.id'), nullable=False)
+    id = db.Column(db.Uuid(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Uuid(as_uuid=False), db.ForeignKey('users.id'), nullable=False)
+    indicator_item_id = db.Column(db.Uuid(as_uuid=False), db.ForeignKey('indicator_items.id'), nullable=False)
     performance = db.Column(db.String(500))
-    rate = db.Column(db.String(100))
-    score = db.Column(db.String(100))
+    rate = db.Column(db.Numeric(asdecimal=False))
+    score = db.Column(db.Numeric(asdecimal=False))
     image_path = db.Column(db.String(500))
+    thumbnail_path = db.Column(db.String(500))
+    web_path = db.Column(db.String(500))
     status = db.Column(db.Enum('draft', 'complete', name='user_data_status'), nullable=False, default='draft')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Transaction that last wrote the row, set by a database trigger (see app/utils/changes.py)
+    change_txid = db.Column(db.BigInteger, nullable=False, default=0)
     
     # Unique constraint for user and indicator item
-    __table_args__ = (db.UniqueConstraint('user_id', 'indicator_item_id'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'indicator_item_id'),
+        db.Index('idx_user_data_indicator_item_updated_at', 'indicator_item_id', 'updated_at'),
+        db.Index('idx_user_data_change_txid', 'change_txid')
+    )
     
-    def to_dict(self):
-        """Convert user data to dictionary"""
-        return {
+    def to_dict(self, compact=False):
+        """Convert user data to dictionary; compact leaves out user_id and created_at"""
+        result = {
             'id': self.id,
-            'user_id': self.user_id,
             'indicator_item_id': self.indicator_item_id,
             'performance': self.performance,
             'rate': self.rate,
             'score': self.score,
             'image_path': self.image_path,
+            'thumbnail_path': self.thumbnail_path,
+            'web_path': self.web_path,
             'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        
+        if not compact:
+            result['user_id'] = self.user_id
+            result['created_at'] = self.created_at.isoformat() if self.created_at else None
+            
+        return result
 
 class UserPermission(db.Model):
     __tablename__ = 'user_permissions'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-    indicator_id = db.Column(db.String(36), db.ForeignKey('indicators.id'), nullable=False)
+    id = db.Column(db.Uuid(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Uuid(as_uuid=False), db.ForeignKey('users.id'), nullable=False)
+    indicator_id = db.Column(db.Uuid(as_uuid=False), db.ForeignKey('indicators.id'), nullable=False)
     can_view = db.Column(db.Boolean, default=False)
     can_edit = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -56,4 +71,39 @@ class UserPermission(db.Model):
             'can_view': self.can_view,
             'can_edit': self.can_edit,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
+
+
+class UserDataDeletion(db.Model):
+    """Tombstone of a deleted user data row, written by a database trigger"""
+    __tablename__ = 'user_data_deletions'
+    
+    id = db.Column(db.Uuid(as_uuid=False), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_data_id = db.Column(db.Uuid(as_uuid=False), nullable=False)
+    user_id = db.Column(db.Uuid(as_uuid=False))
+    indicator_item_id = db.Column(db.Uuid(as_uuid=False), nullable=False)
+    assessment_id = db.Column(db.Uuid(as_uuid=False), db.ForeignKey('assessments.id', ondelete='CASCADE'), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    change_txid = db.Column(db.BigInteger, nullable=False, server_default='0')
+    
+    __table_args__ = (db.Index('idx_user_data_deletions_assessment_change', 'assessment_id', 'change_txid'),)
+    
+    def to_dict(self):
+        """Convert deletion to dictionary"""
+        return {
+            'id': self.user_data_id,
+            'user_id': self.user_id,
+            'indicator_item_id': self.indicator_item_id,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
+
+# Postgres stamps change_txid with txid_current() (database/init/01-schema.sql). SQLite
+# has a single writer, so numbering rows after the highest change_txid keeps commit order.
+for _operation in ('INSERT', 'UPDATE'):
+    event.listen(UserData.__table__, 'after_create', DDL(f"""
+        CREATE TRIGGER stamp_user_data_change_{_operation.lower()} AFTER {_operation} ON user_data
+        BEGIN
+            UPDATE user_data SET change_txid = (SELECT COALESCE(MAX(change_txid), 0) + 1 FROM user_data)
+            WHERE id = NEW.id;
+        END
+    """).execute_if(dialect='sqlite'))
@@ -1,10 +1,24 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app as app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.user import User
+from app.utils.auth import get_current_user
 from app.models.assessment import Assessment, AssessmentItem, Indicator, IndicatorItem
 from app.models.user_data import UserPermission
+from app.utils.permissions import invalidate_permissions, permission_matrix, update_permission_matrix
+from app.utils.cache import assessment_etag, get_assessment_tree, get_cache, is_fresh
+from app.utils.assessment_tree import (
+    AssessmentTreePatch, AssessmentTreeWriter, blank_title_counts, clone_assessment_tree, delete_assessment_tree,
+    next_assessment_name, permitted_assessment_tree
+)
+from app.utils.spreadsheet import iter_rows, spreadsheet_format
+from app.utils.pagination import get_page_limit, keyset_page, prefix_filter
+from app.utils.progress import rebuild_progress
+from app.utils.events import RESET, queue_event
+from app.utils.serialization import is_compact, json_response
+from app.utils.snapshots import load_snapshot, save_snapshot
 from database import db
 from datetime import datetime
+import uuid
 
 assessment_bp = Blueprint('assessment', __name__)
 
@@ -13,23 +27,43 @@ assessment_bp = Blueprint('assessment', __name__)
 def get_assessments():
     """Get all assessments based on user role"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
             
+        query = Assessment.query
+        
         # Admin and Moderator can see all assessments
-        if current_user.role in ['Admin', 'Moderator']:
-            assessments = Assessment.query.all()
-        else:
+        if current_user.role not in ['Admin', 'Moderator']:
             # Regular users can only see published assessments
-            assessments = Assessment.query.filter_by(status='published').all()
+            query = query.filter_by(status='published')
+            
+        # Optional filters
+        fiscal_year = request.args.get('fiscal_year', type=int)
+        if fiscal_year:
+            query = query.filter_by(fiscal_year=fiscal_year)
+        if request.args.get('status'):
+            query = query.filter_by(status=request.args['status'])
+        if request.args.get('q'):
+            query = query.filter(prefix_filter(Assessment.name, request.args['q']))
+            
+        # Newest fiscal year first, paged by (fiscal_year, created_at, id)
+        assessments, next_cursor = keyset_page(
+            query,
+            [Assessment.fiscal_year, Assessment.created_at, Assessment.id],
+            request.args.get('cursor'),
+            get_page_limit(),
+            descending=True
+        )
             
         return jsonify({
-            'assessments': [assessment.to_dict() for assessment in assessments]
+            'assessments': [assessment.to_dict() for assessment in assessments],
+            'next_cursor': next_cursor
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -39,7 +73,7 @@ def create_assessment():
     """Create new assessment"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         if not current_user or current_user.role not in ['Admin', 'Moderator']:
             return jsonify({'error': 'Insufficient permissions'}), 403
@@ -50,75 +84,134 @@ def create_assessment():
             return jsonify({'error': 'Fiscal year is required'}), 400
             
         # Generate assessment name
-        base_name = f"ปีงบประมาณ{data['fiscal_year']}"
-        name = base_name
-        counter = 1
-        
-        # Check for duplicate names and append number if needed
-        while Assessment.query.filter_by(name=name).first():
-            name = f"{base_name}-{counter}"
-            counter += 1
-            
         assessment = Assessment(
-            name=name,
+            id=str(uuid.uuid4()),
+            name=next_assessment_name(data['fiscal_year']),
             fiscal_year=data['fiscal_year'],
             created_by=current_user_id
         )
         
         db.session.add(assessment)
+        db.session.flush()
         
-        # Add assessment items if provided
-        if data.get('items'):
-            for item_idx, item_data in enumerate(data['items']):
-                if item_data.get('title'):
-                    assessment_item = AssessmentItem(
-                        assessment_id=assessment.id,
-                        title=item_data['title'],
-                        order_index=item_idx
-                    )
-                    db.session.add(assessment_item)
-                    
-                    # Add indicators if provided
-                    if item_data.get('indicators'):
-                        for ind_idx, indicator_data in enumerate(item_data['indicators']):
-                            if indicator_data.get('title'):
-                                indicator = Indicator(
-                                    assessment_item_id=assessment_item.id,
-                                    title=indicator_data['title'],
-                                    order_index=ind_idx
-                                )
-                                db.session.add(indicator)
-                                
-                                # Add indicator items if provided
-                                if indicator_data.get('items'):
-                                    for itm_idx, indicator_item_data in enumerate(indicator_data['items']):
-                                        if indicator_item_data.get('title'):
-                                            indicator_item = IndicatorItem(
-                                                indicator_id=indicator.id,
-                                                title=indicator_item_data['title'],
-                                                target_value=indicator_item_data.get('target_value'),
-                                                actual_target=indicator_item_data.get('actual_target'),
-                                                order_index=itm_idx
-                                            )
-                                            db.session.add(indicator_item)
-                                
-                                # Add user permissions if provided
-                                if indicator_data.get('permissions'):
-                                    for permission_data in indicator_data['permissions']:
-                                        if permission_data.get('user_id'):
-                                            permission = UserPermission(
-                                                user_id=permission_data['user_id'],
-                                                indicator_id=indicator.id,
-                                                can_view=permission_data.get('can_view', False),
-                                                can_edit=permission_data.get('can_edit', False)
-                                            )
-                                            db.session.add(permission)
+        # Add assessment items, indicators, indicator items and permissions in bulk
+        writer = AssessmentTreeWriter(assessment.id)
+        writer.add_tree(data.get('items'))
+        writer.flush()
+        rebuild_progress(assessment.id)
         
         db.session.commit()
+        invalidate_permissions()
         
         return jsonify({
             'message': 'Assessment created successfully',
-            'assessment': assessment.to_dict(include_items=True)
+            'assessment': get_assessment_tree(assessment)
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@assessment_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_assessment():
+    """Create new assessment from a CSV/XLSX template"""
+    try:
+        current_user_id = get_jwt_identity()
+        current_user = get_current_user()
+        
+        if not current_user or current_user.role not in ['Admin', 'Moderator']:
+            return jsonify({'error': 'Insufficient permissions'}), 403
+            
+        fiscal_year = request.form.get('fiscal_year', type=int)
+        
+        if not fiscal_year:
+            return jsonify({'error': 'Fiscal year is required'}), 400
+            
+        file = request.files.get('file')
+        file_format = spreadsheet_format(file.filename) if file else None
+        
+        if not file_format:
+            return jsonify({'error': 'Invalid file type. Only CSV and XLSX are allowed'}), 400
+            
+        assessment = Assessment(
+            id=str(uuid.uuid4()),
+            name=next_assessment_name(fiscal_year),
+            fiscal_year=fiscal_year,
+            created_by=current_user_id
+        )
+        
+        db.session.add(assessment)
+        db.session.flush()
+        
+        # Stream rows from the file straight into bulk inserts
+        user_ids = dict(db.session.query(User.username, User.id))
+        writer = AssessmentTreeWriter(assessment.id)
+        
+        try:
+            writer.add_rows(iter_rows(file, file_format), user_ids)
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
+            
+        writer.flush()
+        rebuild_progress(assessment.id)
+        db.session.commit()
+        invalidate_permissions()
+        
+        return jsonify({
+            'message': 'Assessment imported successfully',
+            'assessment': assessment.to_dict(),
+            'counts': writer.counts
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@assessment_bp.route('/<assessment_id>/clone', methods=['POST'])
+@jwt_required()
+def clone_assessment(assessment_id):
+    """Copy an assessment tree, optionally with its permissions, into a new draft for another fiscal year"""
+    try:
+        current_user_id = get_jwt_identity()
+        current_user = get_current_user()
+        
+        if not current_user or current_user.role not in ['Admin', 'Moderator']:
+            return jsonify({'error': 'Insufficient permissions'}), 403
+            
+        data = request.get_json() or {}
+        
+        if not data.get('fiscal_year'):
+            return jsonify({'error': 'Fiscal year is required'}), 400
+            
+        source = Assessment.query.get(assessment_id)
+        
+        if not source:
+            return jsonify({'error': 'Assessment not found'}), 404
+            
+        assessment = Assessment(
+            id=str(uuid.uuid4()),
+            name=next_assessment_name(data['fiscal_year']),
+            fiscal_year=data['fiscal_year'],
+            created_by=current_user_id
+        )
+        
+        db.session.add(assessment)
+        db.session.flush()
+        
+        # Copied inside the database; no rows of the tree are loaded
+        counts = clone_assessment_tree(source.id, assessment.id, bool(data.get('include_permissions')))
+        rebuild_progress(assessment.id)
+        db.session.commit()
+        
+        if counts['permissions']:
+            invalidate_permissions()
+            
+        return jsonify({
+            'message': 'Assessment cloned successfully',
+            'assessment': assessment.to_dict(),
+            'counts': counts
         }), 201
         
     except Exception as e:
@@ -130,8 +223,7 @@ def create_assessment():
 def get_assessment(assessment_id):
     """Get specific assessment"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
@@ -145,9 +237,61 @@ def get_assessment(assessment_id):
         if current_user.role not in ['Admin', 'Moderator'] and assessment.status != 'published':
             return jsonify({'error': 'Access denied'}), 403
             
-        return jsonify({
-            'assessment': assessment.to_dict(include_items=True)
-        }), 200
+        # Let clients revalidate without rebuilding the tree
+        compact = is_compact()
+        etag = assessment_etag(assessment, compact)
+        # Published trees are sent as the stored compressed snapshot when the client takes gzip;
+        # those bytes get their own ETag
+        send_gzip = assessment.status == 'published' and bool(request.accept_encodings['gzip'])
+        if send_gzip and is_fresh(f'{etag}-gz', assessment.updated_at):
+            response = app.response_class(status=304)
+            etag = f'{etag}-gz'
+        elif is_fresh(etag, assessment.updated_at):
+            response = app.response_class(status=304)
+        else:
+            document = load_snapshot(assessment, compact) if send_gzip else None
+                
+            if document is not None:
+                response = app.response_class(document, mimetype='application/json')
+                response.content_encoding = 'gzip'
+                etag = f'{etag}-gz'
+            else:
+                response = json_response({
+                    'assessment': get_assessment_tree(assessment, compact)
+                })
+                
+        response.vary.add('Accept-Encoding')
+        response.set_etag(etag)
+        response.last_modified = assessment.updated_at
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@assessment_bp.route('/<assessment_id>/permitted', methods=['GET'])
+@jwt_required()
+def get_permitted_assessment(assessment_id):
+    """Get an assessment pruned to the indicators the current user may view"""
+    try:
+        current_user = get_current_user()
+        
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        assessment = Assessment.query.get(assessment_id)
+        
+        if not assessment:
+            return jsonify({'error': 'Assessment not found'}), 404
+            
+        # Check permissions
+        if current_user.role not in ['Admin', 'Moderator'] and assessment.status != 'published':
+            return jsonify({'error': 'Access denied'}), 403
+            
+        return json_response({
+            'assessment': permitted_assessment_tree(assessment, current_user, is_compact())
+        })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -157,8 +301,7 @@ def get_assessment(assessment_id):
 def update_assessment(assessment_id):
     """Update assessment"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         if not current_user or current_user.role not in ['Admin', 'Moderator']:
             return jsonify({'error': 'Insufficient permissions'}), 403
@@ -174,16 +317,12 @@ def update_assessment(assessment_id):
         if 'status' in data:
             if data['status'] == 'published':
                 # Validate that all required fields are filled
-                validation_errors = []
-                for item in assessment.items:
-                    if not item.title.strip():
-                        validation_errors.append(f"Assessment item title is required")
-                    for indicator in item.indicators:
-                        if not indicator.title.strip():
-                            validation_errors.append(f"Indicator title is required")
-                        for indicator_item in indicator.items:
-                            if not indicator_item.title.strip():
-                                validation_errors.append(f"Indicator item title is required")
+                blank_items, blank_indicators, blank_indicator_items = blank_title_counts(assessment.id)
+                validation_errors = (
+                    ["Assessment item title is required"] * blank_items +
+                    ["Indicator title is required"] * blank_indicators +
+                    ["Indicator item title is required"] * blank_indicator_items
+                )
                 
                 if validation_errors:
                     return jsonify({
@@ -194,11 +333,121 @@ def update_assessment(assessment_id):
             assessment.status = data['status']
             
         assessment.updated_at = datetime.utcnow()
+        
+        # Readers of a published assessment fetch this instead of the four tree tables
+        if assessment.status == 'published':
+            tree = save_snapshot(assessment)
+        else:
+            tree = get_assessment_tree(assessment)
+            
         db.session.commit()
         
         return jsonify({
             'message': 'Assessment updated successfully',
-            'assessment': assessment.to_dict(include_items=True)
+            'assessment': tree
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@assessment_bp.route('/<assessment_id>', methods=['PATCH'])
+@jwt_required()
+def patch_assessment(assessment_id):
+    """Apply structural operations (add, update, move, remove) to an assessment tree"""
+    try:
+        current_user = get_current_user()
+        
+        if not current_user or current_user.role not in ['Admin', 'Moderator']:
+            return jsonify({'error': 'Insufficient permissions'}), 403
+            
+        # Structural edits of one assessment run one at a time
+        assessment = Assessment.query.filter_by(id=assessment_id).with_for_update().first()
+        
+        if not assessment:
+            return jsonify({'error': 'Assessment not found'}), 404
+            
+        data = request.get_json() or {}
+        patch = AssessmentTreePatch(assessment.id, data.get('operations'))
+        
+        try:
+            refs = patch.apply()
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
+            
+        # New tree version for caches and ETags; open reports reload
+        assessment.updated_at = datetime.utcnow()
+        if assessment.status == 'published':
+            save_snapshot(assessment)
+        queue_event(assessment.id, RESET)
+        db.session.commit()
+        
+        if patch.removed or patch.permissions_added:
+            invalidate_permissions()
+            
+        return jsonify({
+            'message': 'Assessment updated successfully',
+            'assessment': assessment.to_dict(),
+            'refs': refs,
+            'counts': patch.counts
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@assessment_bp.route('/<assessment_id>/permissions', methods=['GET'])
+@jwt_required()
+def get_permission_matrix(assessment_id):
+    """Get the indicator x user permission grid of an assessment"""
+    try:
+        current_user = get_current_user()
+        
+        if not current_user or current_user.role not in ['Admin', 'Moderator']:
+            return jsonify({'error': 'Insufficient permissions'}), 403
+            
+        assessment = Assessment.query.get(assessment_id)
+        
+        if not assessment:
+            return jsonify({'error': 'Assessment not found'}), 404
+            
+        return json_response(permission_matrix(assessment.id))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@assessment_bp.route('/<assessment_id>/permissions', methods=['PUT'])
+@jwt_required()
+def update_permissions(assessment_id):
+    """Grant and revoke indicator permissions of an assessment in bulk"""
+    try:
+        current_user = get_current_user()
+        
+        if not current_user or current_user.role not in ['Admin', 'Moderator']:
+            return jsonify({'error': 'Insufficient permissions'}), 403
+            
+        # Progress counters are adjusted by difference, one change at a time
+        assessment = Assessment.query.filter_by(id=assessment_id).with_for_update().first()
+        
+        if not assessment:
+            return jsonify({'error': 'Assessment not found'}), 404
+            
+        data = request.get_json() or {}
+        
+        try:
+            counts = update_permission_matrix(assessment.id, data.get('permissions'))
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
+            
+        # Reports list permissions and hide indicators users cannot view; open ones reload
+        queue_event(assessment.id, RESET)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Permissions updated successfully',
+            'counts': counts
         }), 200
         
     except Exception as e:
@@ -210,8 +459,7 @@ def update_assessment(assessment_id):
 def delete_assessment(assessment_id):
     """Delete assessment"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         if not current_user or current_user.role not in ['Admin', 'Moderator']:
             return jsonify({'error': 'Insufficient permissions'}), 403
@@ -221,8 +469,9 @@ def delete_assessment(assessment_id):
         if not assessment:
             return jsonify({'error': 'Assessment not found'}), 404
             
-        db.session.delete(assessment)
+        delete_assessment_tree(assessment.id)
         db.session.commit()
+        get_cache('assessment_tree').pop(assessment_id)
         
         return jsonify({'message': 'Assessment deleted successfully'}), 200
         
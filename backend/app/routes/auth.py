@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required
 from app.models.user import User
+from app.utils.auth import get_current_user, revoke_user, user_claims
+from app.utils.pagination import get_page_limit, keyset_page, prefix_filter
 from database import db
 
 auth_bp = Blueprint('auth', __name__)
@@ -17,7 +19,7 @@ def login():
         user = User.query.filter_by(username=data['username']).first()
         
         if user and user.check_password(data['password']) and user.is_active:
-            access_token = create_access_token(identity=user.id)
+            access_token = create_access_token(identity=user.id, additional_claims=user_claims(user))
             return jsonify({
                 'access_token': access_token,
                 'user': user.to_dict()
@@ -33,13 +35,12 @@ def login():
 def get_profile():
     """Get current user profile"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        current_user = get_current_user()
         
-        if not user or not user.is_active:
+        if not current_user or not current_user.user:
             return jsonify({'error': 'User not found'}), 404
             
-        return jsonify({'user': user.to_dict()}), 200
+        return jsonify({'user': current_user.to_dict()}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -49,16 +50,70 @@ def get_profile():
 def get_users():
     """Get all users (for admin/moderator)"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         if not current_user or current_user.role not in ['Admin', 'Moderator']:
             return jsonify({'error': 'Insufficient permissions'}), 403
             
-        users = User.query.filter_by(is_active=True).all()
+        query = User.query.filter_by(is_active=True)
+        
+        # Optional filters
+        if request.args.get('role'):
+            query = query.filter_by(role=request.args['role'])
+        if request.args.get('q'):
+            query = query.filter(prefix_filter(User.username, request.args['q']))
+            
+        users, next_cursor = keyset_page(
+            query,
+            [User.username],
+            request.args.get('cursor'),
+            get_page_limit()
+        )
+        
+        return jsonify({
+            'users': [user.to_dict() for user in users],
+            'next_cursor': next_cursor
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/users/<user_id>/status', methods=['PUT'])
+@jwt_required()
+def set_user_status(user_id):
+    """Activate or deactivate a user (admin only); deactivated users are locked out"""
+    try:
+        current_user = get_current_user()
+        
+        if not current_user or current_user.role != 'Admin':
+            return jsonify({'error': 'Insufficient permissions'}), 403
+            
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('is_active'), bool):
+            return jsonify({'error': 'is_active must be true or false'}), 400
+            
+        if user_id == current_user.id and not data['is_active']:
+            return jsonify({'error': 'You cannot deactivate your own account'}), 400
+            
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        user.is_active = data['is_active']
+        db.session.commit()
+        
+        # Takes effect at once in this process, within USER_STATUS_TTL elsewhere
+        revoke_user(user_id)
+        
         return jsonify({
-            'users': [user.to_dict() for user in users]
+            'message': 'User status updated successfully',
+            'user': user.to_dict()
         }), 200
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -1,27 +1,79 @@
-from flask import Blueprint, request, jsonify, current_app as app
+from flask import Blueprint, Response, request, jsonify, current_app as app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from werkzeug.utils import secure_filename
 from app.models.user import User
-from app.models.assessment import IndicatorItem, Indicator
+from app.utils.auth import create_scoped_token, get_current_user, user_from_scoped_token
+from app.models.assessment import Assessment, AssessmentItem, IndicatorItem, Indicator
 from app.models.user_data import UserData, UserPermission
+from app.models.progress import ProgressCounter
+from app.utils.report import EXPORT_HEADER, build_assessment_report, iter_export_rows
+from app.utils.changes import CursorExpired, changes_cursor, get_user_data_changes
+from app.utils.events import queue_event, stream_events
+from app.utils.pagination import get_page_limit
+from app.utils.spreadsheet import stream_csv, stream_xlsx
+from app.utils.sql import upsert
+from app.utils.images import existing_variants, process_image_async
+from app.utils.storage import attach_blob, detach_blob, store_upload, sweep_uploads
+from app.utils.progress import assessment_id_for_indicator, rebuild_progress, record_status_changes
+from app.utils.serialization import is_compact, json_response
 from database import db
-import os
-from PIL import Image
+import math
+import uuid
+from datetime import datetime
 
 user_data_bp = Blueprint('user_data', __name__)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+REQUIRED_FIELDS = ['performance', 'rate', 'score']
+DATA_FIELDS = ['performance', 'rate', 'score', 'status']
+NUMERIC_FIELDS = ['rate', 'score']
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def find_missing_fields(data, user_data=None):
+    """Return required fields that are empty in data, or in the stored user data when not provided"""
+    missing_fields = []
+    
+    for field in REQUIRED_FIELDS:
+        value = data[field] if field in data else (getattr(user_data, field) if user_data else None)
+        if value is None or not str(value).strip():
+            missing_fields.append(field)
+            
+    return missing_fields
+
+def parse_number(value):
+    """Convert a submitted rate/score to float; empty values become None"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, bool):
+        raise ValueError('Not a number')
+        
+    number = float(str(value).replace(',', '').strip())
+    if not math.isfinite(number):
+        raise ValueError('Not a number')
+    return number
+
+def parse_numeric_fields(data):
+    """Return (parsed numeric fields present in data, names of fields that are not numbers)"""
+    numbers = {}
+    invalid_fields = []
+    
+    for field in NUMERIC_FIELDS:
+        if field in data:
+            try:
+                numbers[field] = parse_number(data[field])
+            except (TypeError, ValueError):
+                invalid_fields.append(field)
+                
+    return numbers, invalid_fields
+
 @user_data_bp.route('/<indicator_item_id>', methods=['GET'])
 @jwt_required()
 def get_user_data(indicator_item_id):
     """Get user data for specific indicator item"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
@@ -41,20 +93,51 @@ def get_user_data(indicator_item_id):
         ).first()
         
         if user_data:
-            return jsonify({'user_data': user_data.to_dict()}), 200
+            return jsonify({'user_data': user_data.to_dict(is_compact())}), 200
         else:
             return jsonify({'user_data': None}), 200
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@user_data_bp.route('/assessment/<assessment_id>', methods=['GET'])
+@jwt_required()
+def get_assessment_user_data(assessment_id):
+    """Get all of the current user's data for an assessment, keyed by indicator item"""
+    try:
+        current_user_id = get_jwt_identity()
+        current_user = get_current_user()
+        
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        query = UserData.query.join(IndicatorItem).join(Indicator).join(AssessmentItem).filter(
+            AssessmentItem.assessment_id == assessment_id,
+            UserData.user_id == current_user_id
+        )
+        
+        # Only return data for indicators the user can view
+        if current_user.role not in ['Admin', 'Moderator']:
+            query = query.join(UserPermission, db.and_(
+                UserPermission.indicator_id == Indicator.id,
+                UserPermission.user_id == current_user_id
+            )).filter(UserPermission.can_view.is_(True))
+            
+        compact = is_compact()
+        return json_response({
+            'user_data': {user_data.indicator_item_id: user_data.to_dict(compact) for user_data in query}
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @user_data_bp.route('/<indicator_item_id>', methods=['POST'])
 @jwt_required()
 def save_user_data(indicator_item_id):
     """Save user data for specific indicator item"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
@@ -65,16 +148,27 @@ def save_user_data(indicator_item_id):
             return jsonify({'error': 'Indicator item not found'}), 404
             
         # Check if user has permission to edit this indicator
-        if not current_user.has_permission(indicator_item.indicator_id, 'view'):
+        if not current_user.has_permission(indicator_item.indicator_id, 'edit'):
             return jsonify({'error': 'Access denied'}), 403
             
         data = request.get_json()
         
-        # Find existing user data or create new
+        numbers, invalid_fields = parse_numeric_fields(data)
+        
+        if invalid_fields:
+            return jsonify({
+                'error': 'Rate and score must be numbers',
+                'invalid_fields': invalid_fields
+            }), 400
+            
+        # Find existing user data or create new; the row stays locked so concurrent
+        # saves count a status change once
         user_data = UserData.query.filter_by(
             user_id=current_user_id,
             indicator_item_id=indicator_item_id
-        ).first()
+        ).with_for_update().first()
+        
+        old_status = user_data.status if user_data else None
         
         if not user_data:
             user_data = UserData(
@@ -86,22 +180,16 @@ def save_user_data(indicator_item_id):
         # Update fields
         if 'performance' in data:
             user_data.performance = data['performance']
-        if 'rate' in data:
-            user_data.rate = data['rate']
-        if 'score' in data:
-            user_data.score = data['score']
+        if 'rate' in numbers:
+            user_data.rate = numbers['rate']
+        if 'score' in numbers:
+            user_data.score = numbers['score']
         if 'status' in data:
             # Validate status change
             if data['status'] == 'complete':
                 # Check if all required fields are filled
-                required_fields = ['performance', 'rate', 'score']
-                missing_fields = []
+                missing_fields = find_missing_fields(data, user_data)
                 
-                for field in required_fields:
-                    value = data.get(field) or getattr(user_data, field)
-                    if not value or not str(value).strip():
-                        missing_fields.append(field)
-                        
                 if missing_fields:
                     return jsonify({
                         'error': 'Required fields are missing',
@@ -110,6 +198,23 @@ def save_user_data(indicator_item_id):
                     
             user_data.status = data['status']
             
+        # Keep progress counters in step within the same transaction
+        assessment_id = assessment_id_for_indicator(indicator_item.indicator_id)
+        record_status_changes([(
+            assessment_id,
+            indicator_item.indicator_id,
+            current_user_id,
+            old_status,
+            user_data.status or 'draft'
+        )])
+        queue_event(assessment_id, {
+            'action': 'save',
+            'indicator_item_id': indicator_item_id,
+            'user_id': current_user_id,
+            'user_name': current_user.full_name,
+            'status': user_data.status or 'draft'
+        })
+            
         db.session.commit()
         
         return jsonify({
@@ -121,13 +226,180 @@ def save_user_data(indicator_item_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@user_data_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def save_user_data_batch():
+    """Save user data for many indicator items in one transaction"""
+    try:
+        current_user_id = get_jwt_identity()
+        current_user = get_current_user()
+        
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('items'), list):
+            return jsonify({'error': 'A list of items is required'}), 400
+            
+        # Ids in any form uuid.UUID accepts are matched in canonical form, as the single-item route does
+        records = []
+        for record in data['items']:
+            if not isinstance(record, dict):
+                continue
+            try:
+                indicator_item_id = str(uuid.UUID(str(record.get('indicator_item_id'))))
+            except ValueError:
+                return jsonify({'error': f"Invalid indicator item id: {record.get('indicator_item_id')}"}), 400
+            records.append(dict(record, indicator_item_id=indicator_item_id))
+            
+        indicator_item_ids = {record['indicator_item_id'] for record in records}
+        
+        # Resolve indicator items for the whole set at once
+        query = db.session.query(
+            IndicatorItem.id, IndicatorItem.indicator_id, AssessmentItem.assessment_id
+        ).select_from(IndicatorItem).join(Indicator).join(AssessmentItem).filter(
+            IndicatorItem.id.in_(indicator_item_ids)
+        )
+        
+        parents = {}
+        can_edit = {}
+        for item_id, indicator_id, item_assessment_id in query:
+            parents[item_id] = (item_assessment_id, indicator_id)
+            can_edit[item_id] = current_user.has_permission(indicator_id, 'edit')
+        
+        # Locked so the statuses progress deltas are computed from stay current
+        existing = {
+            user_data.indicator_item_id: user_data
+            for user_data in UserData.query.filter(
+                UserData.user_id == current_user_id,
+                UserData.indicator_item_id.in_(indicator_item_ids)
+            ).order_by(UserData.id).with_for_update()
+        }
+        
+        rows = []
+        changes = []
+        errors = []
+        seen = set()
+        now = datetime.utcnow()
+        
+        for record in records:
+            indicator_item_id = record['indicator_item_id']
+            
+            if indicator_item_id not in can_edit:
+                errors.append({'indicator_item_id': indicator_item_id, 'error': 'Indicator item not found'})
+                continue
+            if not can_edit[indicator_item_id]:
+                errors.append({'indicator_item_id': indicator_item_id, 'error': 'Access denied'})
+                continue
+            if indicator_item_id in seen:
+                errors.append({'indicator_item_id': indicator_item_id, 'error': 'Duplicate indicator item'})
+                continue
+                
+            numbers, invalid_fields = parse_numeric_fields(record)
+            
+            if invalid_fields:
+                errors.append({
+                    'indicator_item_id': indicator_item_id,
+                    'error': 'Rate and score must be numbers',
+                    'invalid_fields': invalid_fields
+                })
+                continue
+                
+            user_data = existing.get(indicator_item_id)
+            
+            # Merge provided fields over the stored row
+            values = {
+                field: record[field] if field in record else getattr(user_data, field, None)
+                for field in DATA_FIELDS
+            }
+            values.update(numbers)
+            values['status'] = values['status'] or 'draft'
+            
+            if values['status'] not in ['draft', 'complete']:
+                errors.append({'indicator_item_id': indicator_item_id, 'error': 'Invalid status'})
+                continue
+                
+            if record.get('status') == 'complete':
+                missing_fields = find_missing_fields(record, user_data)
+                if missing_fields:
+                    errors.append({
+                        'indicator_item_id': indicator_item_id,
+                        'error': 'Required fields are missing',
+                        'missing_fields': missing_fields
+                    })
+                    continue
+                    
+            seen.add(indicator_item_id)
+            changes.append(parents[indicator_item_id] + (
+                current_user_id,
+                user_data.status if user_data else None,
+                values['status']
+            ))
+            rows.append(dict(
+                values,
+                id=user_data.id if user_data else str(uuid.uuid4()),
+                user_id=current_user_id,
+                indicator_item_id=indicator_item_id,
+                created_at=user_data.created_at if user_data else now,
+                updated_at=now
+            ))
+            
+        saved = []
+        
+        if rows:
+            stmt = upsert(UserData)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[UserData.user_id, UserData.indicator_item_id],
+                set_={
+                    'performance': stmt.excluded.performance,
+                    'rate': stmt.excluded.rate,
+                    'score': stmt.excluded.score,
+                    'status': stmt.excluded.status,
+                    'updated_at': stmt.excluded.updated_at
+                }
+            )
+            returned = db.session.scalars(
+                stmt.returning(UserData),
+                rows,
+                execution_options={'populate_existing': True, 'render_nulls': True}
+            ).all()
+            
+            # A row meant to be new that comes back with another id was inserted by a
+            # concurrent request; its prior status is unknown, so progress cannot be counted
+            if {user_data.id for user_data in returned} != {row['id'] for row in rows}:
+                db.session.rollback()
+                return jsonify({'error': 'Data was saved concurrently, please retry'}), 409
+                
+            saved = [user_data.to_dict() for user_data in returned]
+            record_status_changes(changes)
+            for row in rows:
+                queue_event(parents[row['indicator_item_id']][0], {
+                    'action': 'save',
+                    'indicator_item_id': row['indicator_item_id'],
+                    'user_id': current_user_id,
+                    'user_name': current_user.full_name,
+                    'status': row['status']
+                })
+            db.session.commit()
+            
+        return jsonify({
+            'message': 'User data saved successfully',
+            'user_data': saved,
+            'errors': errors
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @user_data_bp.route('/<indicator_item_id>/upload', methods=['POST'])
 @jwt_required()
 def upload_image(indicator_item_id):
     """Upload image for indicator item"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
@@ -137,8 +409,8 @@ def upload_image(indicator_item_id):
         if not indicator_item:
             return jsonify({'error': 'Indicator item not found'}), 404
             
-        # Check if user has permission
-        if not current_user.has_permission(indicator_item.indicator_id, 'view'):
+        # Check if user has permission to edit this indicator
+        if not current_user.has_permission(indicator_item.indicator_id, 'edit'):
             return jsonify({'error': 'Access denied'}), 403
             
         if 'file' not in request.files:
@@ -150,54 +422,63 @@ def upload_image(indicator_item_id):
             return jsonify({'error': 'No file selected'}), 400
             
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            
-            # Create unique filename
-            import time
-            timestamp = str(int(time.time()))
-            filename = f"{current_user_id}_{indicator_item_id}_{timestamp}_{filename}"
-            
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            
-            # Save and validate image
-            file.save(filepath)
-            
+            # Store by content hash; identical images are kept once
             try:
-                # Validate it's a valid image
-                with Image.open(filepath) as img:
-                    img.verify()
-                    
-                # Update user data with image path
-                user_data = UserData.query.filter_by(
+                filename = store_upload(file, app.config['UPLOAD_FOLDER'])
+            except ValueError:
+                return jsonify({'error': 'Invalid image file'}), 400
+                
+            # Update user data with image path; locked like a save
+            user_data = UserData.query.filter_by(
+                user_id=current_user_id,
+                indicator_item_id=indicator_item_id
+            ).with_for_update().first()
+            
+            if not user_data:
+                user_data = UserData(
                     user_id=current_user_id,
                     indicator_item_id=indicator_item_id
-                ).first()
+                )
+                db.session.add(user_data)
+                record_status_changes([(
+                    assessment_id_for_indicator(indicator_item.indicator_id),
+                    indicator_item.indicator_id,
+                    current_user_id,
+                    None,
+                    'draft'
+                )])
                 
-                if not user_data:
-                    user_data = UserData(
-                        user_id=current_user_id,
-                        indicator_item_id=indicator_item_id
-                    )
-                    db.session.add(user_data)
-                    
-                # Remove old image if exists
-                if user_data.image_path and os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], user_data.image_path)):
-                    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], user_data.image_path))
-                    
+            if user_data.image_path != filename:
+                # Old image is removed by the sweeper once nothing references it
+                detach_blob(user_data.image_path)
+                attach_blob(filename)
+                
+                variants = existing_variants(app.config['UPLOAD_FOLDER'], filename) or {}
                 user_data.image_path = filename
-                db.session.commit()
+                user_data.thumbnail_path = variants.get('thumbnail')
+                user_data.web_path = variants.get('web')
                 
-                return jsonify({
-                    'message': 'Image uploaded successfully',
-                    'image_path': filename
-                }), 200
+                queue_event(assessment_id_for_indicator(indicator_item.indicator_id), {
+                    'action': 'upload',
+                    'indicator_item_id': indicator_item_id,
+                    'user_id': current_user_id,
+                    'user_name': current_user.full_name,
+                    'status': user_data.status or 'draft'
+                })
                 
-            except Exception:
-                # Remove invalid file
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-                return jsonify({'error': 'Invalid image file'}), 400
+            db.session.commit()
+            
+            # Thumbnail and web variants are generated in the background
+            if not user_data.thumbnail_path:
+                process_image_async(user_data.id, filename)
                 
+            return jsonify({
+                'message': 'Image uploaded successfully',
+                'image_path': filename,
+                'thumbnail_path': user_data.thumbnail_path,
+                'web_path': user_data.web_path
+            }), 200
+            
         else:
             return jsonify({'error': 'Invalid file type. Only PNG, JPG, JPEG, GIF are allowed'}), 400
             
@@ -209,81 +490,296 @@ def upload_image(indicator_item_id):
 def get_assessment_report(assessment_id):
     """Get assessment report data"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        current_user = get_current_user()
         
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
             
-        from app.models.assessment import Assessment
         assessment = Assessment.query.get(assessment_id)
         
         if not assessment or assessment.status != 'published':
             return jsonify({'error': 'Assessment not found or not published'}), 404
             
-        report_data = []
+        # Taken before reading so changes made while the report is built are polled again
+        cursor = changes_cursor()
+        report_data = build_assessment_report(assessment, current_user, is_compact())
         
-        for item in assessment.items:
-            item_data = {
-                'title': item.title,
-                'indicators': []
-            }
+        return json_response({
+            'report': report_data,
+            'cursor': cursor,
+            'assessment_updated_at': assessment.updated_at.isoformat() if assessment.updated_at else None
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@user_data_bp.route('/report/<assessment_id>/changes', methods=['GET'])
+@jwt_required()
+def get_assessment_report_changes(assessment_id):
+    """Get report user data changed or deleted since the cursor of a previous report/changes call"""
+    try:
+        current_user = get_current_user()
+        
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
             
-            for indicator in item.indicators:
-                # Check if user has permission to see this indicator
-                if current_user.role in ['Admin', 'Moderator'] or current_user.has_permission(indicator.id, 'view'):
-                    indicator_data = {
-                        'title': indicator.title,
-                        'items': [],
-                        'user_data': []
-                    }
-                    
-                    for indicator_item in indicator.items:
-                        indicator_data['items'].append(indicator_item.to_dict())
-                        
-                        # Get user data for this indicator item
-                        if current_user.role in ['Admin', 'Moderator']:
-                            # Show all user data
-                            user_data_list = UserData.query.filter_by(indicator_item_id=indicator_item.id).all()
-                            for ud in user_data_list:
-                                user_info = User.query.get(ud.user_id)
-                                indicator_data['user_data'].append({
-                                    'user_name': user_info.full_name if user_info else 'Unknown',
-                                    'status': ud.status,
-                                    'data': ud.to_dict()
-                                })
-                        else:
-                            # Show only current user data
-                            user_data = UserData.query.filter_by(
-                                user_id=current_user_id,
-                                indicator_item_id=indicator_item.id
-                            ).first()
-                            if user_data:
-                                indicator_data['user_data'].append({
-                                    'user_name': current_user.full_name,
-                                    'status': user_data.status,
-                                    'data': user_data.to_dict()
-                                })
-                    
-                    # Add permission info for admin/moderator
-                    if current_user.role in ['Admin', 'Moderator']:
-                        permissions = UserPermission.query.filter_by(indicator_id=indicator.id).all()
-                        indicator_data['permissions'] = []
-                        for perm in permissions:
-                            user_info = User.query.get(perm.user_id)
-                            if user_info:
-                                indicator_data['permissions'].append({
-                                    'user_name': user_info.full_name,
-                                    'can_view': perm.can_view,
-                                    'can_edit': perm.can_edit
-                                })
-                    
-                    item_data['indicators'].append(indicator_data)
+        assessment = Assessment.query.get(assessment_id)
+        
+        if not assessment or assessment.status != 'published':
+            return jsonify({'error': 'Assessment not found or not published'}), 404
+            
+        if not request.args.get('cursor'):
+            return jsonify({'error': 'Cursor is required'}), 400
             
-            if item_data['indicators']:  # Only add items that have visible indicators
-                report_data.append(item_data)
+        changes = get_user_data_changes(
+            assessment.id, current_user, request.args['cursor'], get_page_limit(), is_compact()
+        )
+        
+        # A different value means the tree itself changed and the report must be reloaded
+        changes['assessment_updated_at'] = assessment.updated_at.isoformat() if assessment.updated_at else None
         
-        return jsonify({'report': report_data}), 200
+        return jsonify(changes), 200
         
+    except CursorExpired:
+        return jsonify({'error': 'Cursor expired, reload the report'}), 410
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@user_data_bp.route('/events/<assessment_id>/token', methods=['POST'])
+@jwt_required()
+def create_events_token(assessment_id):
+    """Issue a short-lived token that only opens the event stream of one assessment"""
+    try:
+        current_user = get_current_user()
+        
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        assessment = Assessment.query.get(assessment_id)
+        
+        if not assessment or assessment.status != 'published':
+            return jsonify({'error': 'Assessment not found or not published'}), 404
+            
+        seconds = app.config['EVENTS_TOKEN_SECONDS']
+        return jsonify({
+            'token': create_scoped_token(current_user, 'events', assessment.id, seconds),
+            'expires_in': seconds
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@user_data_bp.route('/events/<assessment_id>', methods=['GET'])
+def stream_assessment_events(assessment_id):
+    """Server-sent events for user data saved in an assessment
+
+    EventSource cannot send headers, so it passes a token from
+    POST /events/<assessment_id>/token as ?token=; session tokens are not accepted
+    in the URL, where access logs would keep them.
+    """
+    try:
+        current_user = user_from_scoped_token(request.args.get('token'), 'events', assessment_id)
+        
+        if not current_user:
+            return jsonify({'error': 'Invalid or expired events token'}), 401
+            
+        assessment = Assessment.query.get(assessment_id)
+        
+        if not assessment or assessment.status != 'published':
+            return jsonify({'error': 'Assessment not found or not published'}), 404
+            
+        # Every stream holds a worker thread; past the cap clients poll /changes instead
+        broker = app.extensions['event_broker']
+        if not broker.open_stream():
+            return jsonify({'error': 'Too many event streams, poll for changes instead'}), 503, {'Retry-After': '60'}
+            
+        # Regular users only hear about their own data, as in the report
+        user_id = current_user.id
+        accept = None if current_user.role in ['Admin', 'Moderator'] else (lambda event: event['user_id'] == user_id)
+        stream = stream_events(
+            broker,
+            assessment.id,
+            accept,
+            app.config['EVENTS_KEEPALIVE'],
+            app.config['EVENTS_STREAM_SECONDS']
+        )
+        
+        # Give the connection back to the pool; the stream stays open for minutes
+        db.session.remove()
+        
+        response = Response(stream, mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        # Runs when the server closes the response, also if the stream never started
+        response.call_on_close(broker.close_stream)
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@user_data_bp.route('/progress/<assessment_id>', methods=['GET'])
+@jwt_required()
+def get_assessment_progress(assessment_id):
+    """Get completion progress per assessment, indicator and user"""
+    try:
+        current_user_id = get_jwt_identity()
+        current_user = get_current_user()
+        
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        query = db.session.query(ProgressCounter, Indicator.title, User.full_name).outerjoin(
+            Indicator, db.and_(ProgressCounter.scope == 'indicator', Indicator.id == ProgressCounter.scope_id)
+        ).outerjoin(
+            User, db.and_(ProgressCounter.scope == 'user', User.id == ProgressCounter.scope_id)
+        ).filter(ProgressCounter.assessment_id == assessment_id)
+        
+        if request.args.get('scope'):
+            query = query.filter(ProgressCounter.scope == request.args['scope'])
+            
+        is_manager = current_user.role in ['Admin', 'Moderator']
+        progress = {'assessment': None, 'indicators': [], 'users': []}
+        
+        for counter, indicator_title, full_name in query:
+            result = counter.to_dict()
+            
+            if counter.scope == 'assessment':
+                progress['assessment'] = result
+            elif counter.scope == 'indicator':
+                # Regular users only see indicators they have permission for
+                if is_manager or current_user.has_permission(counter.scope_id, 'view'):
+                    result['title'] = indicator_title
+                    progress['indicators'].append(result)
+            elif is_manager or counter.scope_id == current_user_id:
+                result['full_name'] = full_name
+                progress['users'].append(result)
+                
+        return jsonify({'progress': progress}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@user_data_bp.route('/progress/rebuild', methods=['POST'])
+@jwt_required()
+def rebuild_assessment_progress():
+    """Recompute progress counters for one assessment, or all when assessment_id is omitted"""
+    try:
+        current_user = get_current_user()
+        
+        if not current_user or current_user.role not in ['Admin', 'Moderator']:
+            return jsonify({'error': 'Access denied'}), 403
+            
+        data = request.get_json(silent=True) or {}
+        
+        if data.get('assessment_id'):
+            assessment_ids = [data['assessment_id']]
+        else:
+            assessment_ids = [id for (id,) in db.session.query(Assessment.id)]
+            
+        # Commit per assessment so a long rebuild does not hold one big transaction
+        for assessment_id in assessment_ids:
+            rebuild_progress(assessment_id)
+            db.session.commit()
+            
+        return jsonify({
+            'message': 'Progress rebuilt successfully',
+            'assessments': len(assessment_ids)
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@user_data_bp.route('/uploads/sweep', methods=['POST'])
+@jwt_required()
+def sweep_unreferenced_uploads():
+    """Delete uploaded images that are no longer referenced by any user data"""
+    try:
+        current_user = get_current_user()
+        
+        if not current_user or current_user.role != 'Admin':
+            return jsonify({'error': 'Access denied'}), 403
+            
+        data = request.get_json(silent=True) or {}
+        result = sweep_uploads(
+            app.config['UPLOAD_FOLDER'],
+            grace_seconds=int(data.get('grace_seconds', app.config.get('UPLOAD_SWEEP_GRACE', 3600)))
+        )
+        
+        return jsonify(dict(result, message='Uploads swept successfully')), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def export_response(assessment_filter, current_user, filename):
+    """Stream export rows as CSV (default) or XLSX"""
+    rows = iter_export_rows(assessment_filter, current_user)
+    
+    if request.args.get('format') == 'xlsx':
+        body = stream_xlsx(EXPORT_HEADER, rows)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        filename = f'{filename}.xlsx'
+    else:
+        body = stream_csv(EXPORT_HEADER, rows)
+        mimetype = 'text/csv'
+        filename = f'{filename}.csv'
+        
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@user_data_bp.route('/report/<assessment_id>/export', methods=['GET'])
+@jwt_required()
+def export_assessment_report(assessment_id):
+    """Export assessment report rows as CSV/XLSX"""
+    try:
+        current_user = get_current_user()
+        
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        assessment = Assessment.query.get(assessment_id)
+        
+        if not assessment or assessment.status != 'published':
+            return jsonify({'error': 'Assessment not found or not published'}), 404
+            
+        return export_response(
+            Assessment.id == assessment.id,
+            current_user,
+            f'report-{assessment.fiscal_year}-{assessment.id}'
+        )
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@user_data_bp.route('/report/export', methods=['GET'])
+@jwt_required()
+def export_reports():
+    """Export report rows of all published assessments in the given fiscal years"""
+    try:
+        current_user = get_current_user()
+        
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
+            
+        fiscal_years = request.args.getlist('fiscal_year', type=int)
+        
+        if not fiscal_years:
+            return jsonify({'error': 'Fiscal year is required'}), 400
+            
+        return export_response(
+            db.and_(Assessment.status == 'published', Assessment.fiscal_year.in_(fiscal_years)),
+            current_user,
+            f"report-{'-'.join(str(year) for year in sorted(fiscal_years))}"
+        )
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,595 @@
+from app.models.assessment import Assessment, AssessmentItem, AssessmentSnapshot, Indicator, IndicatorItem
+from app.models.user_data import UserData, UserDataDeletion, UserPermission
+from app.models.progress import ProgressCounter
+from app.utils.progress import apply_progress_changes, progress_contributions
+from app.utils.sql import derived_uuid, is_uuid
+from database import db
+from datetime import datetime
+import uuid
+
+def next_assessment_name(fiscal_year):
+    """Find a free assessment name for a fiscal year with a single query"""
+    base_name = f"ปีงบประมาณ{fiscal_year}"
+
+    taken = {
+        name for (name,) in db.session.query(Assessment.name).filter(
+            db.or_(Assessment.name == base_name, Assessment.name.like(f'{base_name}-%'))
+        )
+    }
+
+    name = base_name
+    counter = 1
+
+    # Append a number if the name is already used
+    while name in taken:
+        name = f"{base_name}-{counter}"
+        counter += 1
+
+    return name
+
+def blank_title_counts(assessment_id):
+    """Number of items, indicators and indicator items with a blank title, counted in one query"""
+    def blank(model):
+        return db.func.count(db.distinct(db.case((db.func.trim(model.title) == '', model.id))))
+
+    return db.session.query(blank(AssessmentItem), blank(Indicator), blank(IndicatorItem)).select_from(
+        AssessmentItem
+    ).outerjoin(
+        Indicator, Indicator.assessment_item_id == AssessmentItem.id
+    ).outerjoin(
+        IndicatorItem, IndicatorItem.indicator_id == Indicator.id
+    ).filter(AssessmentItem.assessment_id == assessment_id).one()
+
+def permitted_assessment_tree(assessment, user, compact=False):
+    """assessment.to_dict(include_items=True) with only the indicators user may view
+
+    Every indicator carries can_edit. Regular users' indicators are selected by joining
+    user_permissions, so the work and the payload follow their own scope; items left
+    without indicators are dropped. Managers get the whole tree.
+    """
+    from app.utils.cache import get_assessment_tree
+
+    if user.role in ['Admin', 'Moderator']:
+        tree = get_assessment_tree(assessment, compact)
+        # The cached tree is shared; flag copies of its indicators
+        return dict(tree, items=[
+            dict(item, indicators=[dict(indicator, can_edit=True) for indicator in item['indicators']])
+            for item in tree['items']
+        ])
+
+    rows = db.session.query(Indicator, UserPermission.can_edit).join(
+        AssessmentItem, AssessmentItem.id == Indicator.assessment_item_id
+    ).join(UserPermission, db.and_(
+        UserPermission.indicator_id == Indicator.id,
+        UserPermission.user_id == user.id
+    )).filter(
+        AssessmentItem.assessment_id == assessment.id,
+        # Saving needs view access; edit-only grants would show indicators that cannot be saved
+        UserPermission.can_view.is_(True)
+    ).options(
+        db.contains_eager(Indicator.assessment_item),
+        db.selectinload(Indicator.items)
+    ).order_by(AssessmentItem.order_index, AssessmentItem.id, Indicator.order_index, Indicator.id)
+
+    items = []
+    for indicator, can_edit in rows:
+        item = indicator.assessment_item
+        if not items or items[-1]['id'] != item.id:
+            items.append(dict(item.to_dict(compact=compact), indicators=[]))
+        items[-1]['indicators'].append(
+            dict(indicator.to_dict(include_items=True, compact=compact), can_edit=bool(can_edit))
+        )
+
+    return dict(assessment.to_dict(compact=compact), items=items)
+
+def delete_assessment_tree(assessment_id):
+    """Delete an assessment and everything under it with one statement per table
+
+    ORM cascades would load and delete each row separately. Uploaded images are
+    released by the sweeper, which reconciles reference counts before deleting.
+    """
+    item_ids = db.select(AssessmentItem.id).where(AssessmentItem.assessment_id == assessment_id)
+    indicator_ids = db.select(Indicator.id).where(Indicator.assessment_item_id.in_(item_ids))
+    indicator_item_ids = db.select(IndicatorItem.id).where(IndicatorItem.indicator_id.in_(indicator_ids))
+
+    for stmt in (
+        db.delete(UserData).where(UserData.indicator_item_id.in_(indicator_item_ids)),
+        db.delete(UserPermission).where(UserPermission.indicator_id.in_(indicator_ids)),
+        db.delete(IndicatorItem).where(IndicatorItem.indicator_id.in_(indicator_ids)),
+        db.delete(Indicator).where(Indicator.assessment_item_id.in_(item_ids)),
+        db.delete(AssessmentItem).where(AssessmentItem.assessment_id == assessment_id),
+        db.delete(ProgressCounter).where(ProgressCounter.assessment_id == assessment_id),
+        db.delete(UserDataDeletion).where(UserDataDeletion.assessment_id == assessment_id),
+        db.delete(AssessmentSnapshot).where(AssessmentSnapshot.assessment_id == assessment_id),
+        db.delete(Assessment).where(Assessment.id == assessment_id)
+    ):
+        db.session.execute(stmt, execution_options={'synchronize_session': False})
+
+def clone_assessment_tree(source_id, target_id, include_permissions=False):
+    """Copy the tree of one assessment under another with one INSERT ... SELECT per table
+
+    New ids are derived from target_id and the source id, so each level finds the
+    copy of its parent without reading any rows into Python. Returns the number of
+    rows copied per table.
+    """
+    now = db.literal(datetime.utcnow(), db.DateTime)
+    item_ids = db.select(AssessmentItem.id).where(AssessmentItem.assessment_id == source_id)
+    indicator_ids = db.select(Indicator.id).where(Indicator.assessment_item_id.in_(item_ids))
+
+    copies = [
+        ('items', AssessmentItem, ['id', 'assessment_id', 'title', 'order_index', 'created_at'], db.select(
+            derived_uuid(target_id, AssessmentItem.id),
+            db.literal(target_id, db.Uuid(as_uuid=False)),
+            AssessmentItem.title,
+            AssessmentItem.order_index,
+            now
+        ).where(AssessmentItem.assessment_id == source_id)),
+        ('indicators', Indicator, ['id', 'assessment_item_id', 'title', 'order_index', 'created_at'], db.select(
+            derived_uuid(target_id, Indicator.id),
+            derived_uuid(target_id, Indicator.assessment_item_id),
+            Indicator.title,
+            Indicator.order_index,
+            now
+        ).where(Indicator.assessment_item_id.in_(item_ids))),
+        ('indicator_items', IndicatorItem, [
+            'id', 'indicator_id', 'title', 'target_value', 'actual_target', 'order_index', 'created_at'
+        ], db.select(
+            derived_uuid(target_id, IndicatorItem.id),
+            derived_uuid(target_id, IndicatorItem.indicator_id),
+            IndicatorItem.title,
+            IndicatorItem.target_value,
+            IndicatorItem.actual_target,
+            IndicatorItem.order_index,
+            now
+        ).where(IndicatorItem.indicator_id.in_(indicator_ids)))
+    ]
+    if include_permissions:
+        copies.append(('permissions', UserPermission, [
+            'id', 'user_id', 'indicator_id', 'can_view', 'can_edit', 'created_at'
+        ], db.select(
+            derived_uuid(target_id, UserPermission.id),
+            UserPermission.user_id,
+            derived_uuid(target_id, UserPermission.indicator_id),
+            UserPermission.can_view,
+            UserPermission.can_edit,
+            now
+        ).where(UserPermission.indicator_id.in_(indicator_ids))))
+
+    counts = dict.fromkeys(('items', 'indicators', 'indicator_items', 'permissions'), 0)
+    for name, model, columns, select in copies:
+        counts[name] = db.session.execute(db.insert(model).from_select(columns, select)).rowcount
+
+    return counts
+
+class AssessmentTreeWriter:
+    """Collect an assessment tree in memory and write it with one bulk insert per table"""
+
+    def __init__(self, assessment_id, batch_size=1000):
+        self.assessment_id = assessment_id
+        self.batch_size = batch_size
+        self.now = datetime.utcnow()
+        self.counts = {'items': 0, 'indicators': 0, 'indicator_items': 0, 'permissions': 0}
+        self._pending = {model: [] for model in (AssessmentItem, Indicator, IndicatorItem, UserPermission)}
+
+    def add_item(self, title, order_index, item_id=None):
+        item_id = item_id or str(uuid.uuid4())
+        self._add(AssessmentItem, {
+            'id': item_id,
+            'assessment_id': self.assessment_id,
+            'title': title,
+            'order_index': order_index,
+            'created_at': self.now
+        })
+        self.counts['items'] += 1
+        return item_id
+
+    def add_indicator(self, assessment_item_id, title, order_index, indicator_id=None):
+        indicator_id = indicator_id or str(uuid.uuid4())
+        self._add(Indicator, {
+            'id': indicator_id,
+            'assessment_item_id': assessment_item_id,
+            'title': title,
+            'order_index': order_index,
+            'created_at': self.now
+        })
+        self.counts['indicators'] += 1
+        return indicator_id
+
+    def add_indicator_item(self, indicator_id, title, order_index, target_value=None, actual_target=None,
+                           indicator_item_id=None):
+        indicator_item_id = indicator_item_id or str(uuid.uuid4())
+        self._add(IndicatorItem, {
+            'id': indicator_item_id,
+            'indicator_id': indicator_id,
+            'title': title,
+            'target_value': target_value,
+            'actual_target': actual_target,
+            'order_index': order_index,
+            'created_at': self.now
+        })
+        self.counts['indicator_items'] += 1
+        return indicator_item_id
+
+    def add_permission(self, indicator_id, user_id, can_view=False, can_edit=False):
+        self._add(UserPermission, {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'indicator_id': indicator_id,
+            'can_view': can_view,
+            'can_edit': can_edit,
+            'created_at': self.now
+        })
+        self.counts['permissions'] += 1
+
+    def add_tree(self, items):
+        """Add nested items/indicators/items/permissions in the create_assessment payload format"""
+        for item_idx, item_data in enumerate(items or []):
+            if not item_data.get('title'):
+                continue
+            item_id = self.add_item(item_data['title'], item_idx)
+
+            for ind_idx, indicator_data in enumerate(item_data.get('indicators') or []):
+                if not indicator_data.get('title'):
+                    continue
+                indicator_id = self.add_indicator(item_id, indicator_data['title'], ind_idx)
+
+                for itm_idx, indicator_item_data in enumerate(indicator_data.get('items') or []):
+                    if indicator_item_data.get('title'):
+                        self.add_indicator_item(
+                            indicator_id,
+                            indicator_item_data['title'],
+                            itm_idx,
+                            indicator_item_data.get('target_value'),
+                            indicator_item_data.get('actual_target')
+                        )
+
+                for permission_data in indicator_data.get('permissions') or []:
+                    if permission_data.get('user_id'):
+                        self.add_permission(
+                            indicator_id,
+                            permission_data['user_id'],
+                            permission_data.get('can_view', False),
+                            permission_data.get('can_edit', False)
+                        )
+
+    def add_rows(self, rows, user_ids):
+        """Add a tree from flat spreadsheet rows
+
+        Each row has item, indicator, indicator_item, target_value, actual_target and
+        users (comma separated usernames granted view and edit on the indicator) columns.
+        Rows with the same item/indicator titles are grouped under the same parent.
+        """
+        item_ids = {}
+        indicator_ids = {}
+        child_counts = {}
+        granted = set()
+
+        for row in rows:
+            item_title = row.get('item')
+            if not item_title:
+                continue
+
+            if item_title not in item_ids:
+                item_ids[item_title] = self.add_item(item_title, len(item_ids))
+            item_id = item_ids[item_title]
+
+            indicator_title = row.get('indicator')
+            if not indicator_title:
+                continue
+
+            if (item_id, indicator_title) not in indicator_ids:
+                order_index = child_counts.get(item_id, 0)
+                child_counts[item_id] = order_index + 1
+                indicator_ids[(item_id, indicator_title)] = self.add_indicator(item_id, indicator_title, order_index)
+            indicator_id = indicator_ids[(item_id, indicator_title)]
+
+            for username in (row.get('users') or '').split(','):
+                username = username.strip()
+                if not username:
+                    continue
+                if username not in user_ids:
+                    raise ValueError(f'Unknown user: {username}')
+                if (indicator_id, username) not in granted:
+                    granted.add((indicator_id, username))
+                    self.add_permission(indicator_id, user_ids[username], can_view=True, can_edit=True)
+
+            if row.get('indicator_item'):
+                order_index = child_counts.get(indicator_id, 0)
+                child_counts[indicator_id] = order_index + 1
+                self.add_indicator_item(
+                    indicator_id,
+                    row['indicator_item'],
+                    order_index,
+                    row.get('target_value') or None,
+                    row.get('actual_target') or None
+                )
+
+    def flush(self):
+        """Write pending rows, parents before children"""
+        for model, rows in self._pending.items():
+            if rows:
+                db.session.execute(db.insert(model), rows)
+                rows.clear()
+
+    def _add(self, model, row):
+        self._pending[model].append(row)
+        if len(self._pending[model]) >= self.batch_size:
+            self.flush()
+
+# Node types of a structural patch: model, parent id column and the type of the parent
+TREE_LEVELS = {
+    'item': (AssessmentItem, 'assessment_id', None),
+    'indicator': (Indicator, 'assessment_item_id', 'item'),
+    'indicator_item': (IndicatorItem, 'indicator_id', 'indicator')
+}
+EDITABLE_FIELDS = {
+    'item': ('title',),
+    'indicator': ('title',),
+    'indicator_item': ('title', 'target_value', 'actual_target')
+}
+
+class AssessmentTreePatch:
+    """Apply add/update/move/remove operations to an assessment tree
+
+    Only the nodes named in the operations and their siblings are read. New nodes
+    are written with one bulk insert per table, changed titles and positions with
+    one bulk update per table and removals with one delete per table, so the cost
+    follows the size of the change rather than of the tree. Progress counters of
+    the indicators involved are adjusted instead of rebuilt.
+
+    Each operation is a dict with op and type (item, indicator or indicator_item):
+
+    - add: title, parent (except for items), optional position and ref; a ref
+      names the new node as id or parent in later operations
+    - update: id and the fields to change
+    - move: id and position among its siblings
+    - remove: id; everything under the node and its user data go with it
+
+    Raises ValueError for operations that do not fit the tree.
+    """
+
+    def __init__(self, assessment_id, operations):
+        self.assessment_id = assessment_id
+        self.operations = operations
+        self.refs = {}
+        self.nodes = {}         # id -> (type, parent id) of every node read or added
+        self.order = {}         # id -> stored order_index of existing nodes
+        self.siblings = {}      # (type, parent id) -> child ids in their new order
+        self.added = {}         # id -> fields of new nodes
+        self.updates = {}       # id -> changed fields of existing nodes
+        self.removed = set()
+        self.counts = {'added': 0, 'updated': 0, 'moved': 0, 'removed': 0}
+        self.permissions_added = 0
+
+    def apply(self):
+        """Apply the operations in the current transaction; returns {ref: new id}"""
+        if not isinstance(self.operations, list) or not all(isinstance(op, dict) for op in self.operations):
+            raise ValueError('Operations must be a list of objects')
+
+        self._load()
+        for op in self.operations:
+            self._apply(op)
+        self._write()
+        return self.refs
+
+    def _resolve(self, value, node_type=None):
+        """Id of an existing or added node, checked against node_type"""
+        node_id = self.refs.get(value, value)
+        if node_id not in self.nodes or self._is_removed(node_id):
+            raise ValueError(f'Unknown {node_type or "node"}: {value}')
+        if node_type and self.nodes[node_id][0] != node_type:
+            raise ValueError(f'Unknown {node_type}: {value}')
+        return node_id
+
+    def _is_removed(self, node_id):
+        while node_id in self.nodes:
+            if node_id in self.removed:
+                return True
+            node_id = self.nodes[node_id][1]
+        return False
+
+    def _load(self):
+        """Read the nodes the operations name, then the siblings of every parent they touch"""
+        wanted = {}
+        for op in self.operations:
+            node_type = op.get('type')
+            if node_type not in TREE_LEVELS:
+                raise ValueError(f'Invalid type: {node_type}')
+            if op.get('op') == 'add':
+                parent_type = TREE_LEVELS[node_type][2]
+                if parent_type and is_uuid(op.get('parent')):
+                    wanted.setdefault(parent_type, set()).add(str(op['parent']))
+            elif is_uuid(op.get('id')):
+                wanted.setdefault(node_type, set()).add(str(op['id']))
+
+        in_assessment = AssessmentItem.assessment_id == self.assessment_id
+        queries = {
+            'item': db.session.query(AssessmentItem.id, AssessmentItem.assessment_id, AssessmentItem.order_index),
+            'indicator': db.session.query(
+                Indicator.id, Indicator.assessment_item_id, Indicator.order_index
+            ).join(AssessmentItem),
+            'indicator_item': db.session.query(
+                IndicatorItem.id, IndicatorItem.indicator_id, IndicatorItem.order_index
+            ).join(Indicator).join(AssessmentItem)
+        }
+
+        for node_type, ids in wanted.items():
+            model = TREE_LEVELS[node_type][0]
+            for node_id, parent_id, order_index in queries[node_type].filter(in_assessment, model.id.in_(ids)):
+                self.nodes[node_id] = (node_type, parent_id)
+                self.order[node_id] = order_index
+
+        # Adding under a node needs its children, moving or removing a node its siblings
+        parents = {}
+        for op in self.operations:
+            node_type = op['type']
+            if op.get('op') == 'add':
+                parent_type = TREE_LEVELS[node_type][2]
+                parent_id = str(op.get('parent')) if parent_type else self.assessment_id
+                if not parent_type or self.nodes.get(parent_id, (None,))[0] == parent_type:
+                    parents.setdefault(node_type, set()).add(parent_id)
+            elif op.get('op') in ('move', 'remove') and self.nodes.get(str(op.get('id')), (None,))[0] == node_type:
+                parents.setdefault(node_type, set()).add(self.nodes[str(op['id'])][1])
+
+        for node_type, parent_ids in parents.items():
+            model, parent_column, _ = TREE_LEVELS[node_type]
+            parent_column = getattr(model, parent_column)
+            for parent_id in parent_ids:
+                self.siblings[(node_type, parent_id)] = []
+            rows = db.session.query(model.id, parent_column, model.order_index).filter(
+                parent_column.in_(parent_ids)
+            ).order_by(parent_column, model.order_index, model.id)
+            for node_id, parent_id, order_index in rows:
+                self.nodes.setdefault(node_id, (node_type, parent_id))
+                self.order[node_id] = order_index
+                self.siblings[(node_type, parent_id)].append(node_id)
+
+    def _position(self, op, siblings):
+        position = op.get('position', len(siblings))
+        if isinstance(position, bool) or not isinstance(position, int):
+            raise ValueError('Position must be an integer')
+        return min(max(position, 0), len(siblings))
+
+    def _fields(self, op, node_type):
+        fields = {field: op[field] for field in EDITABLE_FIELDS[node_type] if field in op}
+        if 'title' in fields and not str(fields['title'] or '').strip():
+            raise ValueError(f'{node_type.replace("_", " ").capitalize()} title is required')
+        return fields
+
+    def _apply(self, op):
+        action = op.get('op')
+        node_type = op['type']
+
+        if action == 'add':
+            parent_type = TREE_LEVELS[node_type][2]
+            parent_id = self._resolve(op.get('parent'), parent_type) if parent_type else self.assessment_id
+            fields = self._fields(op, node_type)
+            if 'title' not in fields:
+                raise ValueError(f'{node_type.replace("_", " ").capitalize()} title is required')
+            if node_type == 'indicator':
+                fields['permissions'] = op.get('permissions') or []
+
+            node_id = str(uuid.uuid4())
+            siblings = self.siblings.setdefault((node_type, parent_id), [])
+            siblings.insert(self._position(op, siblings), node_id)
+            self.nodes[node_id] = (node_type, parent_id)
+            self.added[node_id] = fields
+            if op.get('ref') is not None:
+                self.refs[str(op['ref'])] = node_id
+            self.counts['added'] += 1
+
+        elif action in ('update', 'move', 'remove'):
+            node_id = self._resolve(op.get('id'), node_type)
+            siblings = self.siblings.get((node_type, self.nodes[node_id][1]))
+
+            if action == 'update':
+                fields = self._fields(op, node_type)
+                target = self.added[node_id] if node_id in self.added else self.updates.setdefault(node_id, {})
+                target.update(fields)
+                self.counts['updated'] += 1
+            elif action == 'move':
+                siblings.remove(node_id)
+                siblings.insert(self._position(op, siblings), node_id)
+                self.counts['moved'] += 1
+            else:
+                siblings.remove(node_id)
+                self.removed.add(node_id)
+                self.counts['removed'] += 1
+
+        else:
+            raise ValueError(f'Invalid op: {action}')
+
+    def _write(self):
+        removed = {node_type: [] for node_type in TREE_LEVELS}
+        for node_id in self.removed:
+            if node_id not in self.added:
+                removed[self.nodes[node_id][0]].append(node_id)
+
+        # Indicators under removed items are removed too
+        removed_indicators = set(removed['indicator'])
+        if removed['item']:
+            removed_indicators.update(
+                indicator_id for (indicator_id,) in db.session.query(Indicator.id).filter(
+                    Indicator.assessment_item_id.in_(removed['item'])
+                )
+            )
+
+        # Indicators whose expected entries change, counted before anything is written
+        affected = set(removed_indicators)
+        affected.update(
+            parent_id for node_id, (node_type, parent_id) in self.nodes.items()
+            if node_type == 'indicator_item' and parent_id not in self.added
+            and (node_id in self.added or node_id in removed['indicator_item'])
+        )
+        affected.difference_update(self.added)
+        before = progress_contributions(self.assessment_id, affected) if affected else None
+
+        if removed_indicators or removed['indicator_item']:
+            indicator_item_ids = db.select(IndicatorItem.id).where(db.or_(
+                IndicatorItem.id.in_(removed['indicator_item']),
+                IndicatorItem.indicator_id.in_(removed_indicators)
+            ))
+            for stmt in (
+                db.delete(UserData).where(UserData.indicator_item_id.in_(indicator_item_ids)),
+                db.delete(UserPermission).where(UserPermission.indicator_id.in_(removed_indicators)),
+                db.delete(IndicatorItem).where(IndicatorItem.id.in_(indicator_item_ids)),
+                db.delete(Indicator).where(Indicator.id.in_(removed_indicators)),
+                db.delete(AssessmentItem).where(AssessmentItem.id.in_(removed['item']))
+            ):
+                db.session.execute(stmt, execution_options={'synchronize_session': False})
+
+        # New nodes in their final positions, parents before children
+        writer = AssessmentTreeWriter(self.assessment_id)
+        positions = {}
+        for (node_type, parent_id), siblings in self.siblings.items():
+            for order_index, node_id in enumerate(siblings):
+                positions[node_id] = order_index
+
+        added_indicators = []
+        for node_id, fields in self.added.items():
+            node_type, parent_id = self.nodes[node_id]
+            if self._is_removed(node_id):
+                continue
+            if node_type == 'item':
+                writer.add_item(fields['title'], positions[node_id], node_id)
+            elif node_type == 'indicator':
+                writer.add_indicator(parent_id, fields['title'], positions[node_id], node_id)
+                added_indicators.append(node_id)
+                for permission in fields['permissions']:
+                    if permission.get('user_id'):
+                        writer.add_permission(
+                            node_id, permission['user_id'],
+                            permission.get('can_view', False), permission.get('can_edit', False)
+                        )
+            else:
+                writer.add_indicator_item(
+                    parent_id, fields['title'], positions[node_id],
+                    fields.get('target_value'), fields.get('actual_target'), node_id
+                )
+        writer.flush()
+        self.permissions_added = writer.counts['permissions']
+
+        # Renamed nodes and siblings whose position changed, one executemany per table
+        changes = {node_type: {} for node_type in TREE_LEVELS}
+        for node_id, fields in self.updates.items():
+            if not self._is_removed(node_id):
+                changes[self.nodes[node_id][0]][node_id] = dict(fields)
+        for node_id, order_index in positions.items():
+            if node_id in self.order and self.order[node_id] != order_index:
+                changes[self.nodes[node_id][0]].setdefault(node_id, {})['order_index'] = order_index
+
+        for node_type, rows in changes.items():
+            if rows:
+                db.session.execute(
+                    db.update(TREE_LEVELS[node_type][0]),
+                    [dict(fields, id=node_id) for node_id, fields in rows.items()]
+                )
+
+        # Indicators added with items or permissions start counting too
+        affected.update(added_indicators)
+        if affected:
+            apply_progress_changes(
+                self.assessment_id,
+                before or {},
+                progress_contributions(self.assessment_id, affected)
+            )
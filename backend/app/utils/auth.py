@@ -0,0 +1,134 @@
+from flask import current_app, g
+from flask_jwt_extended import create_access_token, decode_token, get_jwt
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from app.utils.cache import get_cache
+from database import db
+from datetime import timedelta
+import time
+
+MANAGER_ROLES = ['Admin', 'Moderator']
+
+def user_claims(user):
+    """Additional JWT claims that let requests skip loading the user"""
+    return {
+        'role': user.role,
+        'full_name': user.full_name,
+        'is_active': bool(user.is_active)
+    }
+
+class CurrentUser:
+    """The authenticated user as described by the JWT claims
+
+    Role checks and permission lookups work without a users query; any other
+    attribute (username, email, to_dict, ...) loads the ORM User on first use.
+    """
+
+    def __init__(self, id, role, full_name=None, is_active=True):
+        self.id = id
+        self.role = role
+        self.full_name = full_name
+        self.is_active = is_active
+        self._user = None
+
+    @property
+    def user(self):
+        """The ORM User, loaded once"""
+        if self._user is None:
+            from app.models.user import User
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+    def has_permission(self, indicator_id, permission_type='view'):
+        """Check if user has permission for specific indicator"""
+        if self.role in MANAGER_ROLES:
+            return True
+
+        from app.utils.permissions import check_permission
+        return check_permission(self.id, indicator_id, permission_type)
+
+    def __getattr__(self, name):
+        user = self.user
+        if user is None:
+            raise AttributeError(name)
+        return getattr(user, name)
+
+def get_user_status(user_id):
+    """Return (is_active, role) for a user, cached for USER_STATUS_TTL seconds
+
+    The users table is read at most once per TTL per process, so deactivation and
+    role changes made directly in the database take effect within that window.
+    """
+    cache = get_cache('user_status')
+    cached = cache.get(user_id)
+
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    from app.models.user import User
+    row = db.session.query(User.is_active, User.role).filter(User.id == user_id).first()
+    status = (bool(row.is_active), row.role) if row else (False, None)
+
+    cache.set(user_id, (time.monotonic() + current_app.config.get('USER_STATUS_TTL', 60), status))
+    return status
+
+def revoke_user(user_id):
+    """Forget the cached status so this process re-reads it on the next request
+
+    Other processes pick up the change when their cached entry expires.
+    """
+    get_cache('user_status').pop(user_id)
+
+def is_token_revoked(claims):
+    """A token is revoked once its user is inactive or no longer has the role it was issued for"""
+    is_active, role = get_user_status(claims['sub'])
+    return not is_active or ('role' in claims and claims['role'] != role)
+
+def get_current_user():
+    """Return the CurrentUser for this request, or None if the token no longer applies"""
+    if 'current_user' not in g:
+        claims = get_jwt()
+
+        if is_token_revoked(claims):
+            g.current_user = None
+        else:
+            # Tokens issued before role claims existed fall back to the stored role
+            role = claims.get('role') or get_user_status(claims['sub'])[1]
+            g.current_user = CurrentUser(claims['sub'], role, claims.get('full_name'), True)
+
+    return g.current_user
+
+def create_scoped_token(user, scope, resource_id, seconds):
+    """Short-lived token that only opens scope for resource_id
+
+    For URLs that end up in access logs, such as EventSource streams, instead of
+    the session token.
+    """
+    return create_access_token(
+        identity=user.id,
+        additional_claims={**user_claims(user), 'scope': scope, 'resource_id': resource_id},
+        expires_delta=timedelta(seconds=seconds)
+    )
+
+def user_from_scoped_token(token, scope, resource_id):
+    """Return the CurrentUser of a token from create_scoped_token, or None if it is
+    invalid, expired, issued for another scope or resource, or revoked"""
+    try:
+        claims = decode_token(token or '')
+    except (JWTExtendedException, PyJWTError):
+        return None
+
+    if claims.get('scope') != scope or claims.get('resource_id') != resource_id or is_token_revoked(claims):
+        return None
+
+    return CurrentUser(claims['sub'], claims['role'], claims.get('full_name'), True)
+
+def register_jwt_callbacks(jwt):
+    """Reject tokens of deactivated users, or users whose role changed, before any route runs
+
+    Scoped tokens are only accepted by the route they were issued for.
+    """
+
+    @jwt.token_in_blocklist_loader
+    def check_token_revoked(jwt_header, jwt_payload):
+        return 'scope' in jwt_payload or is_token_revoked(jwt_payload)
@@ -0,0 +1,119 @@
+from flask import current_app, request
+from collections import OrderedDict
+from datetime import timezone
+import threading
+
+class LRUCache:
+    """Thread-safe cache that keeps at most max_entries recently used values"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+def get_cache(name):
+    """Return the named LRU cache of the current app, creating it on first use"""
+    caches = current_app.extensions.setdefault('lru_caches', {})
+
+    if name not in caches:
+        size = current_app.config.get(f'{name.upper()}_CACHE_SIZE', 64)
+        caches[name] = LRUCache(size)
+
+    return caches[name]
+
+def assessment_version(assessment):
+    """Version of an assessment tree; writers must bump updated_at when any child changes"""
+    updated_at = assessment.updated_at
+    if not updated_at:
+        return ''
+
+    # Postgres hands timestamptz back with an offset; compare in the naive UTC it was written in
+    if updated_at.tzinfo is not None:
+        updated_at = updated_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return updated_at.isoformat()
+
+def assessment_etag(assessment, compact=False):
+    """Strong ETag for the serialized assessment tree in full or compact form"""
+    return f"{assessment.id}-{assessment_version(assessment)}{'-c' if compact else ''}"
+
+def is_fresh(etag, last_modified=None):
+    """Check whether the client's cached copy matches etag/last_modified"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+
+    if request.if_modified_since and last_modified:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return request.if_modified_since >= last_modified.replace(microsecond=0)
+
+    return False
+
+def load_assessment_tree(assessment):
+    """Full and compact assessment.to_dict(include_items=True), read with one query per level
+
+    Returns {False: full tree, True: compact tree}.
+    """
+    from app.models.assessment import Assessment, AssessmentItem, Indicator
+    from database import db
+
+    db.session.query(Assessment).filter_by(id=assessment.id).options(
+        db.selectinload(Assessment.items)
+        .selectinload(AssessmentItem.indicators)
+        .selectinload(Indicator.items)
+    ).populate_existing().one()
+
+    return {
+        False: assessment.to_dict(include_items=True),
+        True: assessment.to_dict(include_items=True, compact=True)
+    }
+
+def get_assessment_tree(assessment, compact=False):
+    """Return assessment.to_dict(include_items=True, compact=compact), rebuilt only when the version changes
+
+    Published assessments are read from their snapshot when it is current.
+    """
+    cache = get_cache('assessment_tree')
+    version = assessment_version(assessment)
+    cached = cache.get(assessment.id)
+
+    # Both forms of one version share an entry
+    if cached and cached[0] == version:
+        trees = cached[1]
+        if compact in trees:
+            return trees[compact]
+    else:
+        trees = {}
+        cache.set(assessment.id, (version, trees))
+
+    if assessment.status == 'published':
+        from app.utils.snapshots import decode_document, load_snapshot
+
+        document = load_snapshot(assessment, compact)
+        if document is not None:
+            trees[compact] = decode_document(document)
+            return trees[compact]
+
+    trees.update(load_assessment_tree(assessment))
+    return trees[compact]
@@ -0,0 +1,156 @@
+from flask import current_app
+from app.models.user import User
+from app.models.assessment import AssessmentItem, Indicator, IndicatorItem
+from app.models.user_data import UserData, UserDataDeletion
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.report import indicator_summaries
+from app.utils.sql import is_uuid
+from database import db
+from datetime import datetime, timedelta, timezone
+
+class CursorExpired(Exception):
+    """The cursor is older than the kept deletion history"""
+
+def _utc(value):
+    """Naive UTC datetime, the form the application writes timestamps in"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _change_horizon():
+    """Lowest change_txid a write not yet visible to this session can commit with
+
+    Every user data write records the id of its transaction in change_txid. On
+    Postgres any transaction still running has an id at or above the xmin of a new
+    snapshot, however long it runs. SQLite allows one writer at a time, which
+    numbers its rows after the highest change_txid.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return db.session.query(db.func.coalesce(db.func.max(UserData.change_txid), 0) + 1).scalar()
+    return db.session.execute(db.text('SELECT txid_snapshot_xmin(txid_current_snapshot())')).scalar()
+
+def changes_cursor():
+    """Cursor for changes committed from now on
+
+    It holds the change horizon, so rows of transactions still running are polled
+    again once they commit; clients apply changes by id, so repeats are harmless.
+    """
+    return encode_cursor([_change_horizon(), datetime.utcnow()])
+
+def parse_changes_cursor(cursor):
+    """Return (horizon, issued_at, after) where after is the (change_txid, id) of the
+    last row of the previous page or None; raises ValueError or CursorExpired"""
+    values = decode_cursor(cursor)
+    if isinstance(values, list) and len(values) == 2 and isinstance(values[0], str):
+        # (updated_at, id) cursor from before change_txid; only a reload can resume
+        raise CursorExpired()
+    if not isinstance(values, list) or len(values) not in (2, 4) or not isinstance(values[0], int):
+        raise ValueError('Invalid cursor')
+
+    try:
+        issued_at = _utc(datetime.fromisoformat(values[1]))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+    after = None
+    if len(values) == 4:
+        if not isinstance(values[2], int) or not is_uuid(values[3]):
+            raise ValueError('Invalid cursor')
+        after = (values[2], values[3])
+
+    # Deletions before the retention window have been pruned
+    if issued_at < datetime.utcnow() - timedelta(days=current_app.config.get('CHANGES_RETENTION_DAYS', 30)):
+        raise CursorExpired()
+
+    return values[0], issued_at, after
+
+def get_user_data_changes(assessment_id, current_user, cursor, limit, compact=False):
+    """Return user data of an assessment changed or deleted after cursor, in report format
+
+    Rows come ordered by (change_txid, id); when there are more than limit, the
+    returned cursor continues after the last one and has_more is set. The cursor
+    after the last page starts at the horizon taken before the first, so rows
+    committed while paging are returned by the next poll. compact is passed on to
+    UserData.to_dict.
+    """
+    horizon, issued_at, after = parse_changes_cursor(cursor)
+    if after is None:
+        # Taken before reading, like the report cursor
+        next_horizon, issued_at = _change_horizon(), datetime.utcnow()
+        since = horizon
+        changed = UserData.change_txid >= horizon
+    else:
+        next_horizon = horizon
+        since = after[0]
+        # (change_txid, id) > after, spelled out so both sides get the column types
+        changed = db.or_(
+            UserData.change_txid > after[0],
+            db.and_(UserData.change_txid == after[0], UserData.id > after[1])
+        )
+    is_manager = current_user.role in ['Admin', 'Moderator']
+
+    query = db.session.query(UserData, User.full_name, IndicatorItem.indicator_id).outerjoin(
+        User, User.id == UserData.user_id
+    ).join(IndicatorItem, IndicatorItem.id == UserData.indicator_item_id).join(Indicator).join(AssessmentItem).filter(
+        AssessmentItem.assessment_id == assessment_id,
+        changed
+    )
+    if not is_manager:
+        query = query.filter(UserData.user_id == current_user.id)
+
+    rows = query.order_by(UserData.change_txid, UserData.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if has_more:
+        last = rows[-1][0]
+        until = last.change_txid
+        next_cursor = encode_cursor([next_horizon, issued_at, last.change_txid, last.id])
+    else:
+        until = None
+        next_cursor = encode_cursor([next_horizon, issued_at])
+
+    deletions_query = db.session.query(UserDataDeletion, IndicatorItem.indicator_id).outerjoin(
+        IndicatorItem, IndicatorItem.id == UserDataDeletion.indicator_item_id
+    ).filter(
+        UserDataDeletion.assessment_id == assessment_id,
+        UserDataDeletion.change_txid >= since
+    )
+    if until is not None:
+        deletions_query = deletions_query.filter(UserDataDeletion.change_txid <= until)
+    if not is_manager:
+        deletions_query = deletions_query.filter(UserDataDeletion.user_id == current_user.id)
+
+    changes = []
+    deleted = []
+    touched = set()
+
+    for user_data, full_name, indicator_id in rows:
+        # Regular users only get indicators they have permission for, as in the report
+        if is_manager or current_user.has_permission(indicator_id, 'view'):
+            touched.add(indicator_id)
+            changes.append({
+                'user_name': full_name or 'Unknown',
+                'status': user_data.status,
+                'data': user_data.to_dict(compact)
+            })
+
+    for deletion, indicator_id in deletions_query.order_by(UserDataDeletion.change_txid, UserDataDeletion.deleted_at):
+        deleted.append(deletion.to_dict())
+        if indicator_id and (is_manager or current_user.has_permission(indicator_id, 'view')):
+            touched.add(indicator_id)
+
+    return {
+        'changes': changes,
+        'deleted': deleted,
+        'summaries': indicator_summaries(assessment_id, current_user, touched) if touched else {},
+        'cursor': next_cursor,
+        'has_more': has_more
+    }
+
+def prune_deletions(retention_days):
+    """Delete tombstones older than the retention window; returns the number removed"""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    return db.session.query(UserDataDeletion).filter(
+        UserDataDeletion.deleted_at < cutoff
+    ).delete(synchronize_session=False)
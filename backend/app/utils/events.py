@@ -0,0 +1,192 @@
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from database import db
+import json
+import queue
+import select
+import threading
+import time
+
+NOTIFY_CHANNEL = 'user_data_events'
+RESET = {'type': 'reset'}
+
+class EventBroker:
+    """Fans events out to the open streams of this process, per assessment"""
+
+    def __init__(self, queue_size=100, max_streams=0):
+        self.queue_size = queue_size
+        self.max_streams = max_streams
+        self.streams = 0
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def open_stream(self):
+        """Take a stream slot; False when max_streams are already open in this process"""
+        with self._lock:
+            if self.max_streams and self.streams >= self.max_streams:
+                return False
+            self.streams += 1
+            return True
+
+    def close_stream(self):
+        with self._lock:
+            self.streams -= 1
+
+    def subscribe(self, assessment_id):
+        subscriber = queue.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(assessment_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, assessment_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(assessment_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[assessment_id]
+
+    def dispatch(self, assessment_id, payload):
+        """Deliver to local subscribers; one that fell behind gets a reset instead"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(assessment_id, ()))
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(payload)
+            except queue.Full:
+                # The client reloads through the changes endpoint
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait(RESET)
+
+    def notify(self, session, events):
+        """Called before commit; brokers that can send within the transaction do so here"""
+        return False
+
+    def publish(self, events):
+        """Called after commit with the (assessment_id, event) pairs of the transaction"""
+        for assessment_id, payload in events:
+            self.dispatch(assessment_id, payload)
+
+    def start(self, app):
+        pass
+
+class PostgresEventBroker(EventBroker):
+    """Sends events with NOTIFY and fans out what a LISTEN thread receives
+
+    NOTIFY is delivered when the transaction commits, to every worker process, so
+    streams see changes saved through any worker. The listener keeps one pool
+    connection per process.
+    """
+
+    def notify(self, session, events):
+        for assessment_id, payload in events:
+            message = json.dumps({'assessment_id': assessment_id, 'event': payload})
+            session.execute(db.select(db.func.pg_notify(NOTIFY_CHANNEL, message)))
+        return True
+
+    def publish(self, events):
+        # Already sent with NOTIFY; the listener delivers them locally too
+        pass
+
+    def start(self, app):
+        thread = threading.Thread(target=self._listen, args=(app,), name='event-listener', daemon=True)
+        thread.start()
+        return thread
+
+    def _listen(self, app):
+        while True:
+            try:
+                with app.app_context():
+                    connection = db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+                try:
+                    connection.exec_driver_sql(f'LISTEN {NOTIFY_CHANNEL}')
+                    raw = connection.connection.dbapi_connection
+
+                    while True:
+                        if select.select([raw], [], [], 60) == ([], [], []):
+                            continue
+                        raw.poll()
+                        while raw.notifies:
+                            message = json.loads(raw.notifies.pop(0).payload)
+                            self.dispatch(message['assessment_id'], message['event'])
+                finally:
+                    connection.invalidate()
+                    connection.close()
+            except Exception:
+                app.logger.exception('Event listener failed, reconnecting')
+                time.sleep(5)
+
+def queue_event(assessment_id, payload):
+    """Send payload to the streams of an assessment once the current transaction commits"""
+    db.session.info.setdefault('pending_events', []).append((assessment_id, payload))
+
+def _broker():
+    return current_app.extensions.get('event_broker') if has_app_context() else None
+
+def _before_commit(session):
+    broker = _broker()
+    events = session.info.get('pending_events')
+    if broker and events and broker.notify(session, events):
+        session.info.pop('pending_events')
+
+def _after_commit(session):
+    broker = _broker()
+    events = session.info.pop('pending_events', None)
+    if broker and events:
+        broker.publish(events)
+
+def _after_rollback(session):
+    session.info.pop('pending_events', None)
+
+def init_events(app):
+    """Set up the user data event broker: Postgres LISTEN/NOTIFY across workers when
+    EVENTS_BACKEND is 'postgres', in-process when it is 'memory'
+
+    Unset, it follows the database, so several gunicorn workers on Postgres share events.
+    """
+    is_postgres = app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql')
+    backend = app.config.get('EVENTS_BACKEND') or ('postgres' if is_postgres else 'memory')
+    broker_class = PostgresEventBroker if backend == 'postgres' and is_postgres else EventBroker
+    broker = broker_class(app.config.get('EVENTS_QUEUE_SIZE', 100), app.config.get('EVENTS_MAX_STREAMS', 0))
+
+    app.extensions['event_broker'] = broker
+
+    # db.session is shared by every app; listen once
+    for name, listener in (
+        ('before_commit', _before_commit),
+        ('after_commit', _after_commit),
+        ('after_rollback', _after_rollback)
+    ):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
+
+    broker.start(app)
+
+def stream_events(broker, assessment_id, accept=None, keepalive=15, max_seconds=300):
+    """Yield server-sent events for an assessment until max_seconds have passed
+
+    accept filters events per client. Comment lines keep idle connections open, and
+    the stream ends periodically so a worker thread is not held forever; EventSource
+    reconnects by itself.
+    """
+    subscriber = broker.subscribe(assessment_id)
+    deadline = time.monotonic() + max_seconds
+
+    try:
+        yield 'retry: 3000\nevent: ready\ndata: {}\n\n'
+
+        while time.monotonic() < deadline:
+            try:
+                payload = subscriber.get(timeout=min(keepalive, max(deadline - time.monotonic(), 0.1)))
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+
+            if payload.get('type') == 'reset':
+                yield 'event: reset\ndata: {}\n\n'
+            elif accept is None or accept(payload):
+                yield f'event: user_data\ndata: {json.dumps(payload)}\n\n'
+    finally:
+        broker.unsubscribe(assessment_id, subscriber)
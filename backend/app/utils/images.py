@@ -0,0 +1,190 @@
+from flask import current_app
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from PIL import Image, ImageOps
+import os
+
+# Leading bytes of the accepted image formats
+IMAGE_SIGNATURES = {
+    b'\x89PNG\r\n\x1a\n': 'PNG',
+    b'\xff\xd8\xff': 'JPEG',
+    b'GIF87a': 'GIF',
+    b'GIF89a': 'GIF'
+}
+
+# Longest edge of each generated variant, in pixels
+IMAGE_VARIANTS = {
+    'thumbnail': 320,
+    'web': 1280
+}
+
+# File extension used to store each format
+IMAGE_EXTENSIONS = {
+    'PNG': 'png',
+    'JPEG': 'jpg',
+    'GIF': 'gif'
+}
+
+MAX_IMAGE_PIXELS = 50_000_000
+
+def sniff_image_format(head):
+    """Return the image format matching the leading bytes, or None"""
+    for signature, image_format in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return image_format
+    return None
+
+def check_image(path):
+    """Raise ValueError unless path has a readable image header of sane dimensions
+
+    Only the header is parsed here; decoding happens in the background worker.
+    """
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+    except (OSError, Image.DecompressionBombError):
+        raise ValueError('Invalid image file')
+
+    if not width or not height or width * height > MAX_IMAGE_PIXELS:
+        raise ValueError('Invalid image file')
+
+def variant_filename(filename, variant):
+    """File name of a generated variant, e.g. photo.jpg -> photo.thumbnail.jpg"""
+    stem = filename.rsplit('.', 1)[0]
+    return f'{stem}.{variant}.jpg'
+
+def existing_variants(upload_folder, filename):
+    """Return {variant: filename} if every variant of filename is on disk, otherwise None"""
+    variants = {variant: variant_filename(filename, variant) for variant in IMAGE_VARIANTS}
+
+    if all(os.path.exists(os.path.join(upload_folder, name)) for name in variants.values()):
+        return variants
+    return None
+
+def generate_variants(upload_folder, filename):
+    """Write a JPEG for each IMAGE_VARIANTS size and return {variant: filename}"""
+    existing = existing_variants(upload_folder, filename)
+    if existing:
+        return existing
+
+    variants = {}
+
+    for variant, size in sorted(IMAGE_VARIANTS.items(), key=lambda entry: -entry[1]):
+        with Image.open(os.path.join(upload_folder, filename)) as img:
+            # Let the JPEG decoder downscale while decoding instead of after
+            img.draft('RGB', (size, size))
+            # Phone cameras store the rotation in EXIF; variants are saved without it
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((size, size))
+
+            if img.mode not in ('RGB', 'L'):
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                rgba = img.convert('RGBA')
+                background.paste(rgba, mask=rgba.getchannel('A'))
+                img = background
+
+            variants[variant] = variant_filename(filename, variant)
+            img.save(os.path.join(upload_folder, variants[variant]), 'JPEG', quality=82, optimize=True, progressive=True)
+
+    return variants
+
+def remove_image_files(upload_folder, filename):
+    """Remove an uploaded image together with its variants"""
+    if not filename:
+        return
+
+    for name in [filename] + [variant_filename(filename, variant) for variant in IMAGE_VARIANTS]:
+        path = os.path.join(upload_folder, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+def get_image_executor():
+    """Return the app's image worker pool, creating it on first use"""
+    extensions = current_app.extensions
+
+    if 'image_executor' not in extensions:
+        extensions['image_executor'] = ThreadPoolExecutor(
+            max_workers=current_app.config.get('IMAGE_WORKERS', 2),
+            thread_name_prefix='image-worker'
+        )
+
+    return extensions['image_executor']
+
+def process_image_async(user_data_id, filename):
+    """Generate variants for an uploaded image in the background
+
+    Must be called after the upload is committed. Returns the worker future.
+    """
+    app = current_app._get_current_object()
+    return get_image_executor().submit(_process_image, app, user_data_id, filename)
+
+def _save_variant_paths(user_data_id, filename, variants):
+    from app.models.user_data import UserData
+    from database import db
+
+    # Skip the update if a newer upload replaced this image meanwhile
+    db.session.query(UserData).filter(
+        UserData.id == user_data_id,
+        UserData.image_path == filename
+    ).update({
+        'thumbnail_path': variants['thumbnail'],
+        'web_path': variants['web']
+    }, synchronize_session=False)
+
+def _process_image(app, user_data_id, filename):
+    from database import db
+
+    upload_folder = app.config['UPLOAD_FOLDER']
+
+    with app.app_context():
+        try:
+            variants = generate_variants(upload_folder, filename)
+            _save_variant_paths(user_data_id, filename, variants)
+            db.session.commit()
+
+            return variants
+
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Image processing failed for %s', filename)
+            raise
+
+def regenerate_missing_variants(upload_folder, grace_seconds=300, batch_size=100):
+    """Generate variants for user data whose image has none, returning the number fixed
+
+    Background tasks are lost when a worker exits (gunicorn recycles them after
+    max_requests), which leaves thumbnail_path/web_path empty. Rows saved within
+    grace_seconds are skipped as their task may still be running.
+    """
+    from app.models.user_data import UserData
+    from database import db
+
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    fixed = 0
+    after = None
+
+    while True:
+        query = db.session.query(UserData.id, UserData.image_path).filter(
+            UserData.image_path.isnot(None),
+            db.or_(UserData.thumbnail_path.is_(None), UserData.web_path.is_(None)),
+            UserData.updated_at < cutoff
+        )
+        if after is not None:
+            query = query.filter(UserData.id > after)
+        rows = query.order_by(UserData.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        for user_data_id, filename in rows:
+            try:
+                variants = generate_variants(upload_folder, filename)
+            except (OSError, ValueError, Image.DecompressionBombError):
+                current_app.logger.warning('Could not generate variants for %s', filename)
+                continue
+            _save_variant_paths(user_data_id, filename, variants)
+            fixed += 1
+
+        db.session.commit()
+        after = rows[-1][0]
+
+    return fixed
@@ -0,0 +1,151 @@
+from flask import Response, current_app, g, has_request_context, request
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from database import db
+import heapq
+import hmac
+import os
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+class RequestMetrics:
+    """Per-route request metrics
+
+    With PROMETHEUS_MULTIPROC_DIR set (gunicorn.conf.py does), every worker writes its
+    values to files there and render() adds up all workers, so a scrape answered by
+    any worker sees the totals of the whole server.
+    """
+
+    def __init__(self):
+        self.registry = CollectorRegistry()
+        self.requests = Counter(
+            'http_requests_total', 'Requests handled.', ('method', 'route', 'status'),
+            registry=self.registry
+        )
+        self.latency = Histogram(
+            'http_request_duration_seconds', 'Time until the response is returned.',
+            ('method', 'route'), buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.sql_statements = Histogram(
+            'http_request_sql_statements', 'SQL statements executed per request.',
+            ('method', 'route'), buckets=QUERY_COUNT_BUCKETS, registry=self.registry
+        )
+        self.sql_duration = Histogram(
+            'http_request_sql_duration_seconds', 'Time spent executing SQL per request.',
+            ('method', 'route'), buckets=LATENCY_BUCKETS, registry=self.registry
+        )
+        self.response_size = Histogram(
+            'http_response_size_bytes', 'Response body size, when known up front.',
+            ('method', 'route'), buckets=SIZE_BUCKETS, registry=self.registry
+        )
+
+    def render(self):
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            return generate_latest(registry)
+        return generate_latest(self.registry)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+
+    if not has_request_context() or 'sql_stats' not in g:
+        return
+
+    stats = g.sql_stats
+    stats['count'] += 1
+    stats['time'] += elapsed
+
+    # Keep only the N slowest statements when the slow-request log is on
+    if stats['slowest'] is not None:
+        entry = (elapsed, stats['count'], statement)
+        if len(stats['slowest']) < current_app.config['SLOW_REQUEST_QUERIES']:
+            heapq.heappush(stats['slowest'], entry)
+        else:
+            heapq.heappushpop(stats['slowest'], entry)
+
+def _handle_error(context):
+    # Failed statements never reach after_cursor_execute
+    if context.cursor is not None and context.connection is not None:
+        started = context.connection.info.get('query_started')
+        if started:
+            started.pop()
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.sql_stats = {
+        'count': 0,
+        'time': 0.0,
+        'slowest': [] if current_app.config['SLOW_REQUEST_MS'] else None
+    }
+
+def _record_request(response):
+    if 'request_started' not in g:
+        return response
+
+    metrics = current_app.extensions['request_metrics']
+    elapsed = time.perf_counter() - g.request_started
+    stats = g.sql_stats
+
+    # Label by URL rule rather than path so ids do not explode the series count
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    labels = (request.method, route)
+
+    metrics.requests.labels(*labels, str(response.status_code)).inc()
+    metrics.latency.labels(*labels).observe(elapsed)
+    metrics.sql_statements.labels(*labels).observe(stats['count'])
+    metrics.sql_duration.labels(*labels).observe(stats['time'])
+    if response.content_length is not None:
+        metrics.response_size.labels(*labels).observe(response.content_length)
+
+    slow_ms = current_app.config['SLOW_REQUEST_MS']
+    if slow_ms and elapsed * 1000 >= slow_ms:
+        worst = '\n'.join(
+            f'  #{order} {duration * 1000:.1f} ms: {" ".join(statement.split())[:500]}'
+            for duration, order, statement in sorted(stats['slowest'], reverse=True)
+        )
+        current_app.logger.warning(
+            'Slow request %s %s: %.1f ms, %d statements, %.1f ms in SQL\n%s',
+            request.method, request.path, elapsed * 1000, stats['count'], stats['time'] * 1000, worst
+        )
+
+    return response
+
+def metrics_view():
+    """Prometheus scrape endpoint, disabled until METRICS_TOKEN is set"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        return Response('Metrics are disabled; set METRICS_TOKEN\n', status=403, mimetype='text/plain')
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+
+    return Response(
+        current_app.extensions['request_metrics'].render(),
+        content_type=CONTENT_TYPE_LATEST
+    )
+
+def init_metrics(app):
+    """Record per-route latency, SQL statements/time and response size, served on /metrics
+
+    Several gunicorn workers are added up through prometheus_client multiprocess mode;
+    see RequestMetrics.
+    """
+    app.config.setdefault('SLOW_REQUEST_MS', 0)
+    app.config.setdefault('SLOW_REQUEST_QUERIES', 5)
+    app.extensions['request_metrics'] = RequestMetrics()
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(db.engine, 'handle_error', _handle_error)
+
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
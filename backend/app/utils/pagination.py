@@ -0,0 +1,57 @@
+from flask import request
+from database import db
+from datetime import datetime
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(values):
+    """Encode keyset values into an opaque cursor string"""
+    payload = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor string back into keyset values"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def get_page_limit():
+    """Read and clamp the limit query argument"""
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+def prefix_filter(column, prefix):
+    """LIKE 'prefix%' filter with wildcards in prefix escaped"""
+    escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.like(f'{escaped}%', escape='\\')
+
+def keyset_page(query, columns, cursor, limit, descending=False):
+    """Return (rows, next_cursor) for a query ordered by columns, starting after cursor
+
+    columns must end with a unique column so the ordering is total.
+    """
+    key = db.tuple_(*columns)
+
+    if cursor:
+        values = decode_cursor(cursor)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('Invalid cursor')
+        values = [
+            datetime.fromisoformat(value) if value and isinstance(column.type, db.DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+        query = query.filter(key < db.tuple_(*values) if descending else key > db.tuple_(*values))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+
+    return rows, next_cursor
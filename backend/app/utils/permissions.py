@@ -0,0 +1,182 @@
+from flask import g, has_app_context
+from database import db
+
+def get_permission_index(user_id):
+    """Return {indicator_id: (can_view, can_edit)} for a user, loaded once per request"""
+    from app.models.user_data import UserPermission
+
+    cache = g.setdefault('permission_index', {}) if has_app_context() else {}
+
+    if user_id not in cache:
+        rows = db.session.query(
+            UserPermission.indicator_id,
+            UserPermission.can_view,
+            UserPermission.can_edit
+        ).filter(UserPermission.user_id == user_id)
+        cache[user_id] = {
+            indicator_id: (bool(can_view), bool(can_edit))
+            for indicator_id, can_view, can_edit in rows
+        }
+
+    return cache[user_id]
+
+def check_permission(user_id, indicator_id, permission_type='view'):
+    """Check a permission against the user's permission index"""
+    can_view, can_edit = get_permission_index(user_id).get(indicator_id, (False, False))
+
+    if permission_type == 'view':
+        return can_view
+    elif permission_type == 'edit':
+        return can_edit
+
+    return False
+
+def invalidate_permissions(user_id=None):
+    """Drop cached permissions for a user, or for everyone when user_id is None"""
+    if not has_app_context() or 'permission_index' not in g:
+        return
+
+    if user_id is None:
+        g.permission_index.clear()
+    else:
+        g.permission_index.pop(user_id, None)
+
+def permission_matrix(assessment_id):
+    """Return the indicator x user permission grid of an assessment, read with one query
+
+    Every indicator is paired with every regular user; managers see everything and are
+    left out. grid[i][j] is [can_view, can_edit] of users[j] on indicators[i].
+    """
+    from app.models.assessment import AssessmentItem, Indicator
+    from app.models.user import User
+    from app.models.user_data import UserPermission
+
+    rows = db.session.query(
+        Indicator.id, Indicator.title, Indicator.assessment_item_id,
+        User.id, User.username, User.full_name, User.is_active,
+        UserPermission.can_view, UserPermission.can_edit
+    ).join(AssessmentItem, AssessmentItem.id == Indicator.assessment_item_id).join(
+        User, User.role == 'User'
+    ).outerjoin(UserPermission, db.and_(
+        UserPermission.indicator_id == Indicator.id,
+        UserPermission.user_id == User.id
+    )).filter(
+        AssessmentItem.assessment_id == assessment_id
+    ).order_by(
+        AssessmentItem.order_index, Indicator.order_index, User.full_name, User.id
+    )
+
+    indicators = []
+    users = []
+    grid = []
+
+    for indicator_id, title, item_id, user_id, username, full_name, is_active, can_view, can_edit in rows:
+        if not indicators or indicators[-1]['id'] != indicator_id:
+            indicators.append({'id': indicator_id, 'title': title, 'assessment_item_id': item_id})
+            grid.append([])
+        # Users repeat in the same order under every indicator
+        if len(indicators) == 1:
+            users.append({'id': user_id, 'username': username, 'full_name': full_name, 'is_active': is_active})
+        grid[-1].append([bool(can_view), bool(can_edit)])
+
+    return {'indicators': indicators, 'users': users, 'grid': grid}
+
+def _expand_cells(changes):
+    """Yield (indicator_id, user_id, can_view, can_edit) for every cell of the changes"""
+    from app.utils.sql import is_uuid
+
+    if not isinstance(changes, list) or not changes:
+        raise ValueError('Permissions must be a non-empty list')
+
+    for change in changes:
+        if not isinstance(change, dict):
+            raise ValueError('Invalid permission change')
+
+        # Either one cell or a block of indicator_ids x user_ids set alike
+        indicator_ids = change['indicator_ids'] if 'indicator_ids' in change else [change.get('indicator_id')]
+        user_ids = change['user_ids'] if 'user_ids' in change else [change.get('user_id')]
+        if not isinstance(indicator_ids, list) or not isinstance(user_ids, list):
+            raise ValueError('indicator_ids and user_ids must be lists')
+
+        for value in indicator_ids + user_ids:
+            if not is_uuid(value):
+                raise ValueError(f'Invalid id: {value}')
+
+        can_view = bool(change.get('can_view', False))
+        can_edit = bool(change.get('can_edit', False))
+        for indicator_id in indicator_ids:
+            for user_id in user_ids:
+                yield str(indicator_id), str(user_id), can_view, can_edit
+
+def update_permission_matrix(assessment_id, changes):
+    """Apply grants and revocations to the permission grid of an assessment
+
+    A cell with can_view and can_edit both false is revoked; any other is upserted on
+    (user_id, indicator_id). Later changes to the same cell win. Progress counters of
+    the touched indicators are adjusted and the permission index of the affected users
+    dropped. Returns {'granted': n, 'revoked': n}; raises ValueError for ids that are not
+    users or indicators of the assessment.
+    """
+    from app.models.assessment import AssessmentItem, Indicator
+    from app.models.user import User
+    from app.models.user_data import UserPermission
+    from app.utils.progress import apply_progress_changes, progress_contributions
+    from app.utils.sql import upsert
+    from datetime import datetime
+    import uuid
+
+    cells = {}
+    for indicator_id, user_id, can_view, can_edit in _expand_cells(changes):
+        cells[(indicator_id, user_id)] = (can_view, can_edit)
+
+    indicator_ids = sorted({indicator_id for indicator_id, _ in cells})
+    user_ids = sorted({user_id for _, user_id in cells})
+
+    found = {str(indicator_id) for indicator_id, in db.session.query(Indicator.id).join(AssessmentItem).filter(
+        AssessmentItem.assessment_id == assessment_id,
+        Indicator.id.in_(indicator_ids)
+    )}
+    if len(found) != len(indicator_ids):
+        raise ValueError(f'Indicator not in assessment: {min(set(indicator_ids) - found)}')
+
+    found = {str(user_id) for user_id, in db.session.query(User.id).filter(User.id.in_(user_ids))}
+    if len(found) != len(user_ids):
+        raise ValueError(f'User not found: {min(set(user_ids) - found)}')
+
+    before = progress_contributions(assessment_id, indicator_ids)
+
+    now = datetime.utcnow()
+    grants = [
+        {
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'indicator_id': indicator_id,
+            'can_view': can_view,
+            'can_edit': can_edit,
+            'created_at': now
+        }
+        for (indicator_id, user_id), (can_view, can_edit) in cells.items()
+        if can_view or can_edit
+    ]
+    revokes = [key for key, value in cells.items() if not any(value)]
+
+    if grants:
+        stmt = upsert(UserPermission)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserPermission.user_id, UserPermission.indicator_id],
+            set_={'can_view': stmt.excluded.can_view, 'can_edit': stmt.excluded.can_edit}
+        )
+        db.session.execute(stmt, grants)
+
+    revoked = 0
+    if revokes:
+        revoked = db.session.execute(db.delete(UserPermission).where(
+            db.tuple_(UserPermission.indicator_id, UserPermission.user_id).in_(revokes)
+        )).rowcount
+
+    apply_progress_changes(assessment_id, before, progress_contributions(assessment_id, indicator_ids))
+
+    for user_id in user_ids:
+        invalidate_permissions(user_id)
+
+    return {'granted': len(grants), 'revoked': revoked}
@@ -0,0 +1,204 @@
+from flask import g, has_app_context
+from app.models.assessment import AssessmentItem, Indicator, IndicatorItem
+from app.models.progress import ProgressCounter
+from app.models.user_data import UserData, UserPermission
+from app.utils.permissions import check_permission
+from app.utils.sql import upsert
+from database import db
+from datetime import datetime
+import uuid
+
+COUNTED_STATUSES = ('draft', 'complete')
+
+def counter_keys(assessment_id, indicator_id, user_id):
+    """Counter rows touched by one user's entry under an indicator"""
+    return [
+        ('assessment', assessment_id),
+        ('indicator', indicator_id),
+        ('user', user_id)
+    ]
+
+def assessment_id_for_indicator(indicator_id):
+    """Look up the assessment an indicator belongs to, once per request"""
+    cache = g.setdefault('indicator_assessments', {}) if has_app_context() else {}
+
+    if indicator_id not in cache:
+        cache[indicator_id] = db.session.query(AssessmentItem.assessment_id).join(
+            Indicator, Indicator.assessment_item_id == AssessmentItem.id
+        ).filter(Indicator.id == indicator_id).scalar()
+
+    return cache[indicator_id]
+
+def record_status_changes(changes):
+    """Apply user data status changes to the progress counters in the current transaction
+
+    changes is an iterable of (assessment_id, indicator_id, user_id, old_status, new_status),
+    with old_status None for new rows. Callers read old_status with the row locked (FOR
+    UPDATE), or concurrent saves would count the same transition twice. Only entries by
+    users granted view on the indicator count towards progress, matching how expected
+    entries are derived.
+    """
+    deltas = {}
+
+    for assessment_id, indicator_id, user_id, old_status, new_status in changes:
+        if old_status == new_status or not check_permission(user_id, indicator_id, 'view'):
+            continue
+
+        for scope, scope_id in counter_keys(assessment_id, indicator_id, user_id):
+            delta = deltas.setdefault((assessment_id, scope, scope_id), {'draft': 0, 'complete': 0})
+            if old_status in COUNTED_STATUSES:
+                delta[old_status] -= 1
+            if new_status in COUNTED_STATUSES:
+                delta[new_status] += 1
+
+    rows = [
+        {
+            'id': str(uuid.uuid4()),
+            'assessment_id': assessment_id,
+            'scope': scope,
+            'scope_id': scope_id,
+            'expected': 0,
+            'draft': delta['draft'],
+            'complete': delta['complete'],
+            'updated_at': datetime.utcnow()
+        }
+        for (assessment_id, scope, scope_id), delta in deltas.items()
+        if delta['draft'] or delta['complete']
+    ]
+
+    if not rows:
+        return
+
+    stmt = upsert(ProgressCounter)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProgressCounter.assessment_id, ProgressCounter.scope, ProgressCounter.scope_id],
+        set_={
+            'draft': ProgressCounter.draft + stmt.excluded.draft,
+            'complete': ProgressCounter.complete + stmt.excluded.complete,
+            'updated_at': stmt.excluded.updated_at
+        }
+    )
+    db.session.execute(stmt, rows)
+
+def progress_contributions(assessment_id, indicator_ids=None):
+    """Counter values that some indicators, or all when indicator_ids is None, add up to
+
+    Returns {(scope, scope_id): {'expected', 'draft', 'complete'}} with a row for
+    the assessment and for every indicator, as rebuild_progress stores them.
+    """
+    in_assessment = AssessmentItem.assessment_id == assessment_id
+    if indicator_ids is not None:
+        in_assessment = db.and_(in_assessment, Indicator.id.in_(indicator_ids))
+
+    # Number of indicator items per indicator
+    item_counts = dict(
+        db.session.query(Indicator.id, db.func.count(IndicatorItem.id))
+        .join(AssessmentItem)
+        .outerjoin(IndicatorItem, IndicatorItem.indicator_id == Indicator.id)
+        .filter(in_assessment)
+        .group_by(Indicator.id)
+    )
+
+    # Users expected to fill each indicator
+    grants = db.session.query(UserPermission.indicator_id, UserPermission.user_id).join(
+        Indicator, Indicator.id == UserPermission.indicator_id
+    ).join(AssessmentItem).filter(in_assessment, UserPermission.can_view.is_(True)).all()
+    granted = set(grants)
+
+    # Entries per indicator, user and status
+    entries = db.session.query(
+        IndicatorItem.indicator_id, UserData.user_id, UserData.status, db.func.count(UserData.id)
+    ).join(UserData, UserData.indicator_item_id == IndicatorItem.id).join(
+        Indicator, Indicator.id == IndicatorItem.indicator_id
+    ).join(AssessmentItem).filter(in_assessment).group_by(
+        IndicatorItem.indicator_id, UserData.user_id, UserData.status
+    )
+
+    counters = {}
+
+    def counter(scope, scope_id):
+        return counters.setdefault((scope, scope_id), {'expected': 0, 'draft': 0, 'complete': 0})
+
+    counter('assessment', assessment_id)
+    for indicator_id in item_counts:
+        counter('indicator', indicator_id)
+
+    for indicator_id, user_id in grants:
+        for key in counter_keys(assessment_id, indicator_id, user_id):
+            counter(*key)['expected'] += item_counts.get(indicator_id, 0)
+
+    for indicator_id, user_id, status, count in entries:
+        if (indicator_id, user_id) in granted and status in COUNTED_STATUSES:
+            for key in counter_keys(assessment_id, indicator_id, user_id):
+                counter(*key)[status] += count
+
+    return counters
+
+def rebuild_progress(assessment_id):
+    """Recompute all progress counters of an assessment from scratch"""
+    counters = progress_contributions(assessment_id)
+
+    now = datetime.utcnow()
+    db.session.execute(db.delete(ProgressCounter).where(ProgressCounter.assessment_id == assessment_id))
+    db.session.execute(db.insert(ProgressCounter), [
+        dict(values, id=str(uuid.uuid4()), assessment_id=assessment_id, scope=scope, scope_id=scope_id, updated_at=now)
+        for (scope, scope_id), values in counters.items()
+    ])
+
+def apply_progress_changes(assessment_id, before, after):
+    """Add the difference between two progress_contributions results to the stored counters
+
+    Used when a structural change only touches some indicators: their contributions
+    are taken before and after the change and the rest of the counters stay as they are.
+    Counters of indicators that are gone, and of users left with nothing, are deleted.
+    """
+    empty = {'expected': 0, 'draft': 0, 'complete': 0}
+    now = datetime.utcnow()
+    rows = []
+    gone = []
+
+    for scope, scope_id in before.keys() | after.keys():
+        if scope == 'indicator' and (scope, scope_id) not in after:
+            gone.append(scope_id)
+            continue
+
+        old = before.get((scope, scope_id), empty)
+        new = after.get((scope, scope_id), empty)
+        rows.append({
+            'id': str(uuid.uuid4()),
+            'assessment_id': assessment_id,
+            'scope': scope,
+            'scope_id': scope_id,
+            'expected': new['expected'] - old['expected'],
+            'draft': new['draft'] - old['draft'],
+            'complete': new['complete'] - old['complete'],
+            'updated_at': now
+        })
+
+    stmt = upsert(ProgressCounter)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProgressCounter.assessment_id, ProgressCounter.scope, ProgressCounter.scope_id],
+        set_={
+            'expected': ProgressCounter.expected + stmt.excluded.expected,
+            'draft': ProgressCounter.draft + stmt.excluded.draft,
+            'complete': ProgressCounter.complete + stmt.excluded.complete,
+            'updated_at': stmt.excluded.updated_at
+        }
+    )
+    db.session.execute(stmt, rows)
+
+    left = [scope_id for scope, scope_id in before.keys() - after.keys() if scope == 'user']
+    if gone or left:
+        db.session.execute(db.delete(ProgressCounter).where(
+            ProgressCounter.assessment_id == assessment_id,
+            db.or_(
+                db.and_(ProgressCounter.scope == 'indicator', ProgressCounter.scope_id.in_(gone)),
+                db.and_(
+                    ProgressCounter.scope == 'user',
+                    ProgressCounter.scope_id.in_(left),
+                    ProgressCounter.expected == 0,
+                    ProgressCounter.draft == 0,
+                    ProgressCounter.complete == 0
+                )
+            )
+        ))
@@ -0,0 +1,181 @@
+from app.models.user import User
+from app.models.assessment import Assessment, AssessmentItem, Indicator, IndicatorItem
+from app.models.user_data import UserData, UserPermission
+from app.utils.cache import get_assessment_tree
+from database import db
+
+def empty_summary():
+    """Summary of an indicator without completed entries; a new dict every call"""
+    return {'complete_entries': 0, 'average_score': None, 'total_score': None, 'average_rate': None}
+
+def _number(value):
+    return round(float(value), 4) if value is not None else None
+
+def indicator_summaries(assessment_id, current_user, indicator_ids=None):
+    """Return {indicator_id: summary} of completed entries, optionally for some indicators only
+
+    Indicators without completed entries are left out unless listed in indicator_ids.
+    """
+    summary_query = db.session.query(
+        IndicatorItem.indicator_id,
+        db.func.count(UserData.id),
+        db.func.avg(UserData.score),
+        db.func.sum(UserData.score),
+        db.func.avg(UserData.rate)
+    ).select_from(IndicatorItem).join(
+        UserData, UserData.indicator_item_id == IndicatorItem.id
+    ).join(Indicator).join(AssessmentItem).filter(
+        AssessmentItem.assessment_id == assessment_id,
+        UserData.status == 'complete'
+    ).group_by(IndicatorItem.indicator_id)
+    if current_user.role not in ['Admin', 'Moderator']:
+        summary_query = summary_query.filter(UserData.user_id == current_user.id)
+    if indicator_ids is not None:
+        summary_query = summary_query.filter(IndicatorItem.indicator_id.in_(indicator_ids))
+
+    summaries = {indicator_id: empty_summary() for indicator_id in indicator_ids or []}
+    for indicator_id, count, average_score, total_score, average_rate in summary_query:
+        summaries[indicator_id] = {
+            'complete_entries': count,
+            'average_score': _number(average_score),
+            'total_score': _number(total_score),
+            'average_rate': _number(average_rate)
+        }
+
+    return summaries
+
+def build_assessment_report(assessment, current_user, compact=False):
+    """Build assessment report data with a fixed number of queries; compact is passed on to to_dict"""
+    is_manager = current_user.role in ['Admin', 'Moderator']
+
+    # The tree comes from the cache or the published snapshot
+    tree = get_assessment_tree(assessment, compact)
+
+    # Load all relevant user data together with user names
+    user_data_query = db.session.query(UserData, User.full_name).outerjoin(
+        User, User.id == UserData.user_id
+    ).join(IndicatorItem).join(Indicator).join(AssessmentItem).filter(
+        AssessmentItem.assessment_id == assessment.id
+    )
+    if not is_manager:
+        user_data_query = user_data_query.filter(UserData.user_id == current_user.id)
+
+    user_data_by_item = {}
+    for user_data, full_name in user_data_query:
+        user_data_by_item.setdefault(user_data.indicator_item_id, []).append({
+            'user_name': full_name or 'Unknown',
+            'status': user_data.status,
+            'data': user_data.to_dict(compact)
+        })
+
+    # Score and rate aggregates of completed entries, computed in SQL
+    summary_by_indicator = indicator_summaries(assessment.id, current_user)
+
+    # Permission info for admin/moderator
+    permissions_by_indicator = {}
+    if is_manager:
+        permission_rows = db.session.query(UserPermission, User.full_name).join(
+            User, User.id == UserPermission.user_id
+        ).join(Indicator).join(AssessmentItem).filter(
+            AssessmentItem.assessment_id == assessment.id
+        )
+        for perm, full_name in permission_rows:
+            permissions_by_indicator.setdefault(perm.indicator_id, []).append({
+                'user_name': full_name,
+                'can_view': perm.can_view,
+                'can_edit': perm.can_edit
+            })
+
+    # Assemble the report in memory
+    report_data = []
+
+    for item in tree['items']:
+        item_data = {
+            'title': item['title'],
+            'indicators': []
+        }
+
+        for indicator in item['indicators']:
+            # Check if user has permission to see this indicator
+            if not (is_manager or current_user.has_permission(indicator['id'], 'view')):
+                continue
+
+            indicator_data = {
+                'id': indicator['id'],
+                'title': indicator['title'],
+                'items': indicator['items'],
+                'user_data': [],
+                'summary': summary_by_indicator.get(indicator['id']) or empty_summary()
+            }
+
+            for indicator_item in indicator['items']:
+                indicator_data['user_data'].extend(user_data_by_item.get(indicator_item['id'], []))
+
+            if is_manager:
+                indicator_data['permissions'] = permissions_by_indicator.get(indicator['id'], [])
+
+            item_data['indicators'].append(indicator_data)
+
+        if item_data['indicators']:  # Only add items that have visible indicators
+            report_data.append(item_data)
+
+    return report_data
+
+EXPORT_HEADER = [
+    'ปีงบประมาณ', 'แบบประเมิน', 'ประเด็น', 'ตัวชี้วัด', 'รายการตัวชี้วัด', 'ค่าเป้าหมาย',
+    'เป้าหมายจริง', 'ผู้กรอกข้อมูล', 'ผลงาน', 'อัตรา', 'คะแนน', 'สถานะ', 'แก้ไขล่าสุด'
+]
+
+def iter_export_rows(assessment_filter, current_user, batch_size=500):
+    """Yield one report row per indicator item per user, read with a server-side cursor"""
+    is_manager = current_user.role in ['Admin', 'Moderator']
+
+    user_data_join = UserData.indicator_item_id == IndicatorItem.id
+    if not is_manager:
+        user_data_join = db.and_(user_data_join, UserData.user_id == current_user.id)
+
+    stmt = db.select(
+        Assessment.fiscal_year,
+        Assessment.name,
+        AssessmentItem.title,
+        Indicator.title,
+        IndicatorItem.title,
+        IndicatorItem.target_value,
+        IndicatorItem.actual_target,
+        User.full_name,
+        UserData.performance,
+        UserData.rate,
+        UserData.score,
+        UserData.status,
+        UserData.updated_at
+    ).select_from(IndicatorItem).join(
+        Indicator, Indicator.id == IndicatorItem.indicator_id
+    ).join(
+        AssessmentItem, AssessmentItem.id == Indicator.assessment_item_id
+    ).join(
+        Assessment, Assessment.id == AssessmentItem.assessment_id
+    ).outerjoin(
+        UserData, user_data_join
+    ).outerjoin(
+        User, User.id == UserData.user_id
+    ).where(assessment_filter).order_by(
+        Assessment.fiscal_year,
+        Assessment.name,
+        AssessmentItem.order_index,
+        Indicator.order_index,
+        IndicatorItem.order_index,
+        User.full_name
+    )
+
+    # Only indicators the user is allowed to see
+    if not is_manager:
+        stmt = stmt.join(UserPermission, db.and_(
+            UserPermission.indicator_id == Indicator.id,
+            UserPermission.user_id == current_user.id,
+            UserPermission.can_view.is_(True)
+        ))
+
+    for row in db.session.execute(stmt.execution_options(yield_per=batch_size)):
+        row = list(row)
+        row[-1] = row[-1].isoformat() if row[-1] else None
+        yield row
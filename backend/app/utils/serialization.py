@@ -0,0 +1,87 @@
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+import json
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+CHUNK_SIZE = 64 * 1024
+
+def dumps(value, default=None):
+    """Encode value as compact JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(value, default=default, ensure_ascii=False, separators=(',', ':')).encode()
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify through orjson when it is installed
+
+    Datetimes are passed through to the Flask default so the output is the same
+    with either encoder.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
+
+def is_compact():
+    """Whether the client asked for the compact form with ?compact=1"""
+    return request.args.get('compact', '').lower() in ('1', 'true', 'yes')
+
+def _iter_pieces(value, depth, default):
+    if depth <= 0 or not value or not isinstance(value, (dict, list, tuple)):
+        yield dumps(value, default)
+        return
+
+    if isinstance(value, dict):
+        yield b'{'
+        for index, (key, item) in enumerate(value.items()):
+            yield (b',' if index else b'') + dumps(str(key)) + b':'
+            yield from _iter_pieces(item, depth - 1, default)
+        yield b'}'
+    else:
+        yield b'['
+        for index, item in enumerate(value):
+            if index:
+                yield b','
+            yield from _iter_pieces(item, depth - 1, default)
+        yield b']'
+
+def iter_json(value, default=None, depth=4, chunk_size=CHUNK_SIZE):
+    """Encode value as JSON in chunks of about chunk_size bytes
+
+    Dicts and lists in the top depth levels are written member by member, so only
+    one subtree at a time is encoded whole and the full document is never held.
+    """
+    buffer = []
+    size = 0
+
+    for piece in _iter_pieces(value, depth, default):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+
+    if buffer:
+        yield b''.join(buffer)
+
+def json_response(value, status=200):
+    """Response with value encoded incrementally by iter_json
+
+    The body is generated after the request context is gone, so value must be
+    plain data rather than ORM objects.
+    """
+    return current_app.response_class(
+        iter_json(value, current_app.json.default), status=status, mimetype='application/json'
+    )
@@ -0,0 +1,53 @@
+from app.models.assessment import AssessmentSnapshot
+from app.utils.cache import assessment_version, get_cache, load_assessment_tree
+from app.utils.serialization import dumps
+from app.utils.sql import upsert
+from database import db
+from datetime import datetime
+import gzip
+import json
+
+def encode_document(tree):
+    """gzip compressed GET /api/assessments/<id> body for a tree"""
+    return gzip.compress(dumps({'assessment': tree}), compresslevel=6)
+
+def decode_document(document):
+    """Tree stored in a snapshot document"""
+    return json.loads(gzip.decompress(document))['assessment']
+
+def save_snapshot(assessment):
+    """Store the tree of a published assessment for its current version; returns the full tree
+
+    Called when an assessment is published or its published structure changes, so
+    readers fetch one row instead of rebuilding the tree from four tables.
+    """
+    trees = load_assessment_tree(assessment)
+    version = assessment_version(assessment)
+
+    stmt = upsert(AssessmentSnapshot).values(
+        assessment_id=assessment.id,
+        version=version,
+        document=encode_document(trees[False]),
+        compact_document=encode_document(trees[True]),
+        created_at=datetime.utcnow()
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[AssessmentSnapshot.assessment_id],
+        set_={
+            'version': stmt.excluded.version,
+            'document': stmt.excluded.document,
+            'compact_document': stmt.excluded.compact_document,
+            'created_at': stmt.excluded.created_at
+        }
+    ))
+
+    get_cache('assessment_tree').set(assessment.id, (version, trees))
+    return trees[False]
+
+def load_snapshot(assessment, compact=False):
+    """Stored document of the current version of an assessment, or None when there is none"""
+    column = AssessmentSnapshot.compact_document if compact else AssessmentSnapshot.document
+    return db.session.query(column).filter(
+        AssessmentSnapshot.assessment_id == assessment.id,
+        AssessmentSnapshot.version == assessment_version(assessment)
+    ).scalar()
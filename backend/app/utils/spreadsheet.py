@@ -0,0 +1,81 @@
+import csv
+import io
+import tempfile
+
+SPREADSHEET_EXTENSIONS = {'csv', 'xlsx'}
+
+def spreadsheet_format(filename):
+    """Return 'csv' or 'xlsx' for a supported file name, otherwise None"""
+    extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    return extension if extension in SPREADSHEET_EXTENSIONS else None
+
+def iter_rows(file, file_format):
+    """Yield each data row of an uploaded CSV/XLSX file as a dict keyed by header"""
+    if file_format == 'csv':
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+        for row in csv.DictReader(stream):
+            yield {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+        return
+
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('XLSX support requires openpyxl')
+
+    workbook = load_workbook(file.stream, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip().lower() if cell is not None else '' for cell in next(rows, [])]
+        for values in rows:
+            yield {
+                key: str(value).strip() if value is not None else ''
+                for key, value in zip(header, values) if key
+            }
+    finally:
+        workbook.close()
+
+def stream_csv(header, rows, chunk_rows=500):
+    """Yield CSV text in chunks, starting with a BOM so Excel reads UTF-8 correctly"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+def stream_xlsx(header, rows, chunk_size=64 * 1024):
+    """Return a generator of XLSX bytes built with a write-only workbook spooled to disk"""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ValueError('XLSX support requires openpyxl')
+
+    def generate():
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(header)
+
+        for row in rows:
+            sheet.append(row)
+
+        with tempfile.TemporaryFile() as output:
+            workbook.save(output)
+            output.seek(0)
+            while True:
+                chunk = output.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    return generate()
@@ -0,0 +1,41 @@
+from database import db
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import sqlite3
+import uuid
+
+def upsert(model):
+    """Return an INSERT for model that supports ON CONFLICT on the current dialect"""
+    if db.engine.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(model)
+
+def is_uuid(value):
+    """Check whether value can be bound to a UUID column"""
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+def derived_uuid(namespace, column):
+    """SQL expression for a UUID derived from namespace and the value of column
+
+    The same pair always gives the same id, so rows copied with INSERT ... SELECT can
+    compute the new id of their copied parent without a mapping table. Uses
+    uuid_generate_v5 from uuid-ossp on Postgres and a Python function on SQLite.
+    """
+    namespace = db.literal(namespace, db.Uuid(as_uuid=False))
+    if db.engine.dialect.name == 'sqlite':
+        return db.func.uuid_generate_v5(namespace, column)
+    return db.func.uuid_generate_v5(namespace, db.cast(column, db.Text))
+
+def _sqlite_uuid5(namespace, name):
+    return uuid.uuid5(uuid.UUID(namespace), str(name)).hex
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('uuid_generate_v5', 2, _sqlite_uuid5, deterministic=True)
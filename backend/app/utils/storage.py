@@ -0,0 +1,184 @@
+from app.models.upload_blob import UploadBlob
+from app.models.user_data import UserData
+from app.utils.images import IMAGE_EXTENSIONS, check_image, regenerate_missing_variants, remove_image_files, sniff_image_format
+from app.utils.sql import upsert
+from database import db
+from datetime import datetime, timedelta
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+# Key for the Postgres advisory lock that keeps one sweeper running across workers
+SWEEP_LOCK_KEY = 0x75706c6f6164
+
+def blob_path(digest, extension):
+    """Sharded relative path of a blob, e.g. ab/cd/abcd1234....png"""
+    return f'{digest[:2]}/{digest[2:4]}/{digest}.{extension}'
+
+def store_upload(file, upload_folder, chunk_size=64 * 1024):
+    """Stream an uploaded image into content-addressed storage and return its relative path
+
+    The upload is hashed while it is written to a temporary file, so identical files
+    are stored once. Raises ValueError if the header is not a PNG/JPEG/GIF image.
+    """
+    head = file.stream.read(chunk_size)
+    image_format = sniff_image_format(head)
+    if not image_format:
+        raise ValueError('Invalid image file')
+
+    digest = hashlib.sha256()
+    output = tempfile.NamedTemporaryFile(dir=upload_folder, prefix='.upload-', delete=False)
+    try:
+        with output:
+            chunk = head
+            while chunk:
+                digest.update(chunk)
+                output.write(chunk)
+                chunk = file.stream.read(chunk_size)
+
+        path = blob_path(digest.hexdigest(), IMAGE_EXTENSIONS[image_format])
+        target = os.path.join(upload_folder, path)
+
+        if os.path.exists(target):
+            # Already stored; refresh mtime so the sweeper leaves it alone
+            os.utime(target)
+        else:
+            check_image(output.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(output.name, target)
+
+        return path
+    finally:
+        if os.path.exists(output.name):
+            os.remove(output.name)
+
+def attach_blob(path):
+    """Count one more reference to a stored blob in the current transaction"""
+    _adjust_ref_count(path, 1)
+
+def detach_blob(path):
+    """Drop one reference to a stored blob; the sweeper deletes it once unreferenced"""
+    if path:
+        _adjust_ref_count(path, -1)
+
+def _adjust_ref_count(path, delta):
+    now = datetime.utcnow()
+    stmt = upsert(UploadBlob).values(path=path, ref_count=max(delta, 0), created_at=now, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UploadBlob.path],
+        set_={'ref_count': UploadBlob.ref_count + delta, 'updated_at': now}
+    )
+    db.session.execute(stmt)
+
+def reconcile_ref_counts(batch_size=500):
+    """Recount references from user_data, fixing counts left behind by cascading deletes"""
+    fixed = 0
+    last_path = ''
+
+    while True:
+        paths = db.session.scalars(
+            db.select(UploadBlob.path).where(UploadBlob.path > last_path).order_by(UploadBlob.path).limit(batch_size)
+        ).all()
+        if not paths:
+            break
+        last_path = paths[-1]
+
+        actual = dict(
+            db.session.query(UserData.image_path, db.func.count(UserData.id))
+            .filter(UserData.image_path.in_(paths))
+            .group_by(UserData.image_path)
+        )
+        stored = dict(db.session.query(UploadBlob.path, UploadBlob.ref_count).filter(UploadBlob.path.in_(paths)))
+
+        for path in paths:
+            if stored[path] != actual.get(path, 0):
+                db.session.query(UploadBlob).filter(UploadBlob.path == path).update(
+                    {'ref_count': actual.get(path, 0)}, synchronize_session=False
+                )
+                fixed += 1
+        db.session.commit()
+
+    return fixed
+
+def sweep_uploads(upload_folder, batch_size=500, grace_seconds=3600):
+    """Delete unreferenced blobs and their variants in batches
+
+    Blobs must have been unreferenced for grace_seconds, so uploads that are still
+    being committed are not removed. Returns {'reconciled': n, 'deleted': n}.
+    """
+    lock_connection = None
+    if db.engine.dialect.name == 'postgresql':
+        # Session-level lock held on a dedicated connection for the whole sweep
+        lock_connection = db.engine.connect()
+        locked = lock_connection.execute(db.select(db.func.pg_try_advisory_lock(SWEEP_LOCK_KEY))).scalar()
+        if not locked:
+            lock_connection.close()
+            return {'reconciled': 0, 'deleted': 0}
+
+    try:
+        reconciled = reconcile_ref_counts(batch_size)
+        deleted = 0
+        cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+
+        while True:
+            paths = db.session.scalars(
+                db.select(UploadBlob.path)
+                .where(UploadBlob.ref_count <= 0, UploadBlob.updated_at < cutoff)
+                .limit(batch_size)
+            ).all()
+            if not paths:
+                break
+
+            # Delete the rows first; a blob re-attached meanwhile keeps its row and its file
+            db.session.query(UploadBlob).filter(
+                UploadBlob.path.in_(paths), UploadBlob.ref_count <= 0
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            kept = set(db.session.scalars(db.select(UploadBlob.path).where(UploadBlob.path.in_(paths))))
+
+            for path in paths:
+                target = os.path.join(upload_folder, path)
+                # A file touched within the grace period is being uploaded again
+                if path in kept or (os.path.exists(target) and os.path.getmtime(target) > cutoff.timestamp()):
+                    continue
+                remove_image_files(upload_folder, path)
+                deleted += 1
+
+        return {'reconciled': reconciled, 'deleted': deleted}
+    finally:
+        if lock_connection is not None:
+            lock_connection.execute(db.select(db.func.pg_advisory_unlock(SWEEP_LOCK_KEY)))
+            lock_connection.close()
+
+def start_upload_sweeper(app):
+    """Run sweep_uploads every UPLOAD_SWEEP_INTERVAL seconds in a daemon thread"""
+    interval = app.config.get('UPLOAD_SWEEP_INTERVAL', 0)
+    if not interval:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    result = sweep_uploads(
+                        app.config['UPLOAD_FOLDER'],
+                        grace_seconds=app.config.get('UPLOAD_SWEEP_GRACE', 3600)
+                    )
+                    if result['deleted']:
+                        app.logger.info('Upload sweep removed %d files', result['deleted'])
+                    # Pick up variants whose worker task was lost
+                    fixed = regenerate_missing_variants(app.config['UPLOAD_FOLDER'])
+                    if fixed:
+                        app.logger.info('Generated missing variants for %d uploads', fixed)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Upload sweep failed')
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=run, name='upload-sweeper', daemon=True)
+    thread.start()
+    return thread
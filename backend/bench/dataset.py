@@ -0,0 +1,123 @@
+from app.models.assessment import Assessment
+from app.models.user import User
+from app.models.user_data import UserData
+from app.utils.assessment_tree import AssessmentTreeWriter
+from app.utils.progress import rebuild_progress
+from app.utils.snapshots import save_snapshot
+from database import db
+from datetime import datetime
+from werkzeug.security import generate_password_hash
+import random
+import uuid
+
+BENCH_PASSWORD = 'bench-password'
+
+DEFAULT_SIZES = {
+    'items': 5,
+    'indicators': 4,             # per item
+    'indicator_items': 5,        # per indicator
+    'users': 50,
+    'permissions': 5,            # users granted view/edit on each indicator
+    'fill': 0.5                  # share of expected user_data rows already entered
+}
+
+def generate_dataset(sizes, seed=0, batch_size=1000):
+    """Create an admin, users and one published assessment tree with bulk inserts
+
+    Returns a description of what was created, used by the scenarios to pick
+    users and indicator items.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    # One hash for everybody; hashing per user would dominate generation time
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+
+    admin_id = str(uuid.uuid4())
+    users = [{
+        'id': admin_id, 'username': 'bench_admin', 'email': 'bench_admin@bench.local',
+        'password_hash': password_hash, 'role': 'Admin', 'full_name': 'Bench Admin',
+        'is_active': True, 'created_at': now, 'updated_at': now
+    }]
+    for index in range(sizes['users']):
+        users.append({
+            'id': str(uuid.uuid4()), 'username': f'bench_user_{index}', 'email': f'bench_user_{index}@bench.local',
+            'password_hash': password_hash, 'role': 'User', 'full_name': f'Bench User {index}',
+            'is_active': True, 'created_at': now, 'updated_at': now
+        })
+    db.session.execute(db.insert(User), users)
+    user_ids = [user['id'] for user in users[1:]]
+
+    assessment = Assessment(
+        id=str(uuid.uuid4()),
+        name=f'bench-{uuid.uuid4().hex[:8]}',
+        fiscal_year=2567,
+        status='published',
+        created_by=admin_id
+    )
+    db.session.add(assessment)
+    db.session.flush()
+
+    writer = AssessmentTreeWriter(assessment.id, batch_size)
+    grants = {}
+    items_by_indicator = {}
+
+    for item_index in range(sizes['items']):
+        item_id = writer.add_item(f'Item {item_index}', item_index)
+
+        for indicator_index in range(sizes['indicators']):
+            indicator_id = writer.add_indicator(item_id, f'Indicator {item_index}.{indicator_index}', indicator_index)
+            items_by_indicator[indicator_id] = [
+                writer.add_indicator_item(indicator_id, f'Indicator item {item_index}.{indicator_index}.{index}', index, '100')
+                for index in range(sizes['indicator_items'])
+            ]
+
+            grants[indicator_id] = rng.sample(user_ids, min(sizes['permissions'], len(user_ids)))
+            for user_id in grants[indicator_id]:
+                writer.add_permission(indicator_id, user_id, can_view=True, can_edit=True)
+
+    writer.flush()
+
+    # Pre-fill a share of the expected entries
+    user_data = []
+    for indicator_id, granted in grants.items():
+        for user_id in granted:
+            for indicator_item_id in items_by_indicator[indicator_id]:
+                if rng.random() < sizes['fill']:
+                    status = rng.choice(['draft', 'complete'])
+                    user_data.append({
+                        'id': str(uuid.uuid4()), 'user_id': user_id, 'indicator_item_id': indicator_item_id,
+                        'performance': 'bench', 'rate': rng.randint(0, 100), 'score': rng.randint(0, 5),
+                        'status': status, 'created_at': now, 'updated_at': now
+                    })
+                    if len(user_data) >= batch_size:
+                        db.session.execute(db.insert(UserData), user_data)
+                        user_data = []
+    if user_data:
+        db.session.execute(db.insert(UserData), user_data)
+
+    rebuild_progress(assessment.id)
+    save_snapshot(assessment)
+    db.session.commit()
+
+    # Work a user with at least one grant can do, for the data entry scenarios
+    assignments = {}
+    for indicator_id, granted in grants.items():
+        for user_id in granted:
+            assignments.setdefault(user_id, []).extend(items_by_indicator[indicator_id])
+
+    usernames = {user['id']: user['username'] for user in users}
+
+    return {
+        'assessment_id': assessment.id,
+        'admin_username': 'bench_admin',
+        'assignments': {usernames[user_id]: item_ids for user_id, item_ids in assignments.items()},
+        'counts': {
+            'users': len(users),
+            'items': writer.counts['items'],
+            'indicators': writer.counts['indicators'],
+            'indicator_items': writer.counts['indicator_items'],
+            'permissions': writer.counts['permissions'],
+            'user_data': db.session.query(db.func.count(UserData.id)).scalar()
+        }
+    }
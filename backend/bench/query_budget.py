@@ -0,0 +1,361 @@
+"""Guard against N+1 queries in the auth, assessment and user_data blueprints
+
+Run from the backend directory:
+
+    python -m bench.query_budget
+
+tests/test_query_budget.py runs the same check under pytest.
+
+Every route is called against a small and a large synthetic dataset with cold
+caches. The run fails when a route has no case here, runs more statements on the
+large dataset than on the small one, or goes over its budget in BUDGETS.
+"""
+from bench.dataset import BENCH_PASSWORD, generate_dataset
+from flask import has_request_context
+from sqlalchemy import event
+import argparse
+import io
+import sys
+import tempfile
+
+BLUEPRINTS = ('auth', 'assessment', 'user_data')
+
+SMALL = {'items': 2, 'indicators': 2, 'indicator_items': 2, 'users': 6, 'permissions': 2, 'fill': 0.5}
+LARGE = {'items': 6, 'indicators': 4, 'indicator_items': 5, 'users': 30, 'permissions': 5, 'fill': 0.5}
+
+# Most SQL statements a request may run, by (method, URL rule). Each budget is the
+# statements listed beside it plus headroom of about a fifth (at least one), so an
+# extra lookup does not fail the run while the size check still catches N+1 loops.
+# Every authenticated request starts by loading the current user. Raising a budget
+# should come with a reason in the commit message.
+BUDGETS = {
+    # user lookup
+    ('POST', '/api/auth/login'): 2,
+    # user, profile
+    ('GET', '/api/auth/profile'): 3,
+    # user, user list
+    ('GET', '/api/auth/users'): 3,
+    # user, target user, update with reload
+    ('PUT', '/api/auth/users/<user_id>/status'): 4,
+    # user, assessment page
+    ('GET', '/api/assessments/'): 3,
+    # user, duplicate name check, one insert per tree level and permissions, progress rebuild,
+    # reload of the tree for the response
+    ('POST', '/api/assessments/'): 20,
+    # user, duplicate name check, users named in the file, inserts, progress rebuild, reload
+    ('POST', '/api/assessments/import'): 17,
+    # user, source and duplicate name check, inserts, progress rebuild, reload
+    ('POST', '/api/assessments/<assessment_id>/clone'): 17,
+    # user, assessment, snapshot
+    ('GET', '/api/assessments/<assessment_id>'): 4,
+    # user, assessment, indicators, indicator items
+    ('GET', '/api/assessments/<assessment_id>/permitted'): 5,
+    # user, assessment with items, status update, tree load and snapshot insert
+    ('PUT', '/api/assessments/<assessment_id>'): 11,
+    # user, tree lookups for the operations, one delete/insert/update per node type,
+    # progress changes, version bump
+    ('PATCH', '/api/assessments/<assessment_id>'): 35,
+    # user, assessment, one delete per dependent table
+    ('DELETE', '/api/assessments/<assessment_id>'): 13,
+    # user, assessment, indicators with permissions
+    ('GET', '/api/assessments/<assessment_id>/permissions'): 4,
+    # user, assessment, indicators and users checked, prior grants, insert/delete, progress changes
+    ('PUT', '/api/assessments/<assessment_id>/permissions'): 16,
+    # user, indicator item, permission, user data
+    ('GET', '/api/user-data/<indicator_item_id>'): 5,
+    # user, user data
+    ('GET', '/api/user-data/assessment/<assessment_id>'): 3,
+    # user, indicator item, permission, prior status, upsert, progress, reload
+    ('POST', '/api/user-data/<indicator_item_id>'): 10,
+    # user, indicator items, permissions, prior statuses, upsert, progress
+    ('POST', '/api/user-data/batch'): 8,
+    # user, indicator item, permission, prior row, blob reference, image update, progress, reload
+    ('POST', '/api/user-data/<indicator_item_id>/upload'): 10,
+    # user, assessment, change horizon, snapshot, user data, indicator items, permissions
+    ('GET', '/api/user-data/report/<assessment_id>'): 9,
+    # user, assessment, change horizon, changed rows, deletions, indicator items
+    ('GET', '/api/user-data/report/<assessment_id>/changes'): 8,
+    # user, progress counters, permissions
+    ('GET', '/api/user-data/progress/<assessment_id>'): 4,
+    # user, assessment
+    ('POST', '/api/user-data/events/<assessment_id>/token'): 3,
+    # user, assessment
+    ('GET', '/api/user-data/events/<assessment_id>'): 3,
+    # user, tree and permissions, delete and insert counters
+    ('POST', '/api/user-data/progress/rebuild'): 8,
+    # user, blob reconciliation, unreferenced blobs
+    ('POST', '/api/user-data/uploads/sweep'): 8,
+    # user, assessment, rows
+    ('GET', '/api/user-data/report/<assessment_id>/export'): 4,
+    # user, rows
+    ('GET', '/api/user-data/report/export'): 3
+}
+
+class RequestQueryCounter:
+    """Counts statements run on behalf of a request, including streamed bodies
+
+    Background work such as image variant generation has no request context and
+    is not counted.
+    """
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        if has_request_context():
+            self.count += 1
+
+class BudgetRun:
+    """Calls each route once against one dataset and records its statement count"""
+
+    def __init__(self, app, dataset, sizes):
+        from app.models.user import User
+        from database import db
+
+        self.app = app
+        self.client = app.test_client()
+        self.dataset = dataset
+        self.sizes = sizes
+        self.counts = {}
+
+        with app.app_context():
+            self.queries = RequestQueryCounter(db.engine)
+            self.user_ids = dict(db.session.query(User.username, User.id))
+
+        # The user with the most assigned indicator items
+        self.username = max(dataset['assignments'], key=lambda name: len(dataset['assignments'][name]))
+        self.items = dataset['assignments'][self.username]
+        self.admin = self.login(dataset['admin_username'])
+        self.user = self.login(self.username)
+
+    def login(self, username):
+        response = self.client.post('/api/auth/login', json={'username': username, 'password': BENCH_PASSWORD})
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def call(self, method, rule, path, **kwargs):
+        """Request path with cold caches and record the statements it ran under rule"""
+        for cache in self.app.extensions.get('lru_caches', {}).values():
+            cache.clear()
+
+        before = self.queries.count
+        response = self.client.open(path, method=method, **kwargs)
+        response.get_data()
+
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method} {path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+
+        self.counts[(method, rule)] = self.queries.count - before
+        return response
+
+    def tree_payload(self):
+        """A create_assessment payload shaped like the dataset"""
+        user_ids = list(self.user_ids.values())
+        return [{
+            'title': f'Item {item}',
+            'indicators': [{
+                'title': f'Indicator {item}.{indicator}',
+                'items': [
+                    {'title': f'Indicator item {item}.{indicator}.{index}', 'target_value': '100'}
+                    for index in range(self.sizes['indicator_items'])
+                ],
+                'permissions': [
+                    {'user_id': user_id, 'can_view': True, 'can_edit': True}
+                    for user_id in user_ids[:self.sizes['permissions']]
+                ]
+            } for indicator in range(self.sizes['indicators'])]
+        } for item in range(self.sizes['items'])]
+
+    def tree_operations(self, assessment_id):
+        """A structural patch touching every node type of an assessment"""
+        tree = self.client.get(f'/api/assessments/{assessment_id}', headers=self.admin).get_json()['assessment']
+        first, second = tree['items'][0]['indicators'][:2]
+        return [
+            {'op': 'add', 'type': 'item', 'ref': 'item', 'title': 'New item', 'position': 0},
+            {'op': 'add', 'type': 'indicator', 'ref': 'indicator', 'parent': 'item', 'title': 'New indicator',
+             'permissions': [{'user_id': user_id, 'can_view': True} for user_id in list(self.user_ids.values())[:2]]},
+            {'op': 'add', 'type': 'indicator_item', 'parent': 'indicator', 'title': 'New indicator item'},
+            {'op': 'add', 'type': 'indicator_item', 'parent': first['id'], 'title': 'Added', 'position': 0},
+            {'op': 'update', 'type': 'indicator_item', 'id': first['items'][1]['id'], 'title': 'Renamed'},
+            {'op': 'move', 'type': 'indicator', 'id': second['id'], 'position': 0},
+            {'op': 'remove', 'type': 'indicator_item', 'id': first['items'][0]['id']},
+            {'op': 'remove', 'type': 'indicator', 'id': tree['items'][1]['indicators'][0]['id']}
+        ]
+
+    def permission_changes(self, matrix):
+        """Grant a block of the permission grid and revoke one existing cell"""
+        indicator_ids = [indicator['id'] for indicator in matrix['indicators']]
+        user_ids = [user['id'] for user in matrix['users']]
+        return [
+            {'indicator_ids': indicator_ids, 'user_ids': user_ids[-2:], 'can_view': True},
+            {'indicator_id': indicator_ids[0], 'user_id': user_ids[0]}
+        ]
+
+    def import_file(self):
+        """A CSV import shaped like the dataset"""
+        usernames = ','.join(sorted(self.dataset['assignments'])[:self.sizes['permissions']])
+        lines = ['item,indicator,indicator_item,target_value,actual_target,users']
+        for item in range(self.sizes['items']):
+            for indicator in range(self.sizes['indicators']):
+                for index in range(self.sizes['indicator_items']):
+                    lines.append(f'Item {item},Indicator {item}.{indicator},Indicator item {index},100,,"{usernames}"')
+        return io.BytesIO('\n'.join(lines).encode())
+
+    def run(self):
+        from PIL import Image
+
+        assessment_id = self.dataset['assessment_id']
+        item_id = self.items[0]
+        user_id = self.user_ids[self.username]
+
+        # auth
+        self.call('GET', '/api/auth/profile', '/api/auth/profile', headers=self.user)
+        self.call('GET', '/api/auth/users', '/api/auth/users', headers=self.admin)
+        self.call('PUT', '/api/auth/users/<user_id>/status', f'/api/auth/users/{user_id}/status',
+                  json={'is_active': True}, headers=self.admin)
+        self.call('POST', '/api/auth/login', '/api/auth/login',
+                  json={'username': self.username, 'password': BENCH_PASSWORD})
+
+        # assessment
+        self.call('GET', '/api/assessments/', '/api/assessments/', headers=self.user)
+        self.call('GET', '/api/assessments/<assessment_id>', f'/api/assessments/{assessment_id}', headers=self.user)
+        self.call('GET', '/api/assessments/<assessment_id>/permitted', f'/api/assessments/{assessment_id}/permitted',
+                  headers=self.user)
+        created = self.call('POST', '/api/assessments/', '/api/assessments/',
+                            json={'fiscal_year': 2568, 'items': self.tree_payload()}, headers=self.admin)
+        imported = self.call('POST', '/api/assessments/import', '/api/assessments/import',
+                             data={'fiscal_year': '2568', 'file': (self.import_file(), 'tree.csv')},
+                             content_type='multipart/form-data', headers=self.admin)
+        created_id = created.get_json()['assessment']['id']
+        self.call('POST', '/api/assessments/<assessment_id>/clone', f'/api/assessments/{assessment_id}/clone',
+                  json={'fiscal_year': 2568, 'include_permissions': True}, headers=self.admin)
+        self.call('PATCH', '/api/assessments/<assessment_id>', f'/api/assessments/{created_id}',
+                  json={'operations': self.tree_operations(created_id)}, headers=self.admin)
+        matrix = self.call('GET', '/api/assessments/<assessment_id>/permissions',
+                           f'/api/assessments/{created_id}/permissions', headers=self.admin)
+        self.call('PUT', '/api/assessments/<assessment_id>/permissions', f'/api/assessments/{created_id}/permissions',
+                  json={'permissions': self.permission_changes(matrix.get_json())}, headers=self.admin)
+        self.call('PUT', '/api/assessments/<assessment_id>', f'/api/assessments/{created_id}',
+                  json={'status': 'published'}, headers=self.admin)
+        self.call('DELETE', '/api/assessments/<assessment_id>',
+                  f"/api/assessments/{imported.get_json()['assessment']['id']}", headers=self.admin)
+
+        # user_data
+        self.call('GET', '/api/user-data/<indicator_item_id>', f'/api/user-data/{item_id}', headers=self.user)
+        self.call('GET', '/api/user-data/assessment/<assessment_id>',
+                  f'/api/user-data/assessment/{assessment_id}', headers=self.user)
+        self.call('POST', '/api/user-data/<indicator_item_id>', f'/api/user-data/{item_id}',
+                  json={'performance': 'budget', 'rate': 50, 'score': 3, 'status': 'complete'}, headers=self.user)
+        self.call('POST', '/api/user-data/batch', '/api/user-data/batch', json={'items': [
+            {'indicator_item_id': id, 'performance': 'budget', 'rate': 50, 'score': 3, 'status': 'complete'}
+            for id in self.items
+        ]}, headers=self.user)
+
+        image = io.BytesIO()
+        Image.new('RGB', (64, 64), (10, 20, 30)).save(image, 'PNG')
+        image.seek(0)
+        self.call('POST', '/api/user-data/<indicator_item_id>/upload', f'/api/user-data/{item_id}/upload',
+                  data={'file': (image, 'budget.png')}, content_type='multipart/form-data', headers=self.user)
+
+        report = self.call('GET', '/api/user-data/report/<assessment_id>',
+                           f'/api/user-data/report/{assessment_id}', headers=self.admin)
+        # Saved after the report so the changes case always has rows and summaries to return
+        self.client.post(f'/api/user-data/{item_id}', json={
+            'performance': 'changed', 'rate': 60, 'score': 4, 'status': 'complete'
+        }, headers=self.user)
+        self.call('GET', '/api/user-data/report/<assessment_id>/changes',
+                  f'/api/user-data/report/{assessment_id}/changes', headers=self.admin,
+                  query_string={'cursor': report.get_json()['cursor']})
+        self.call('GET', '/api/user-data/progress/<assessment_id>',
+                  f'/api/user-data/progress/{assessment_id}', headers=self.user)
+        token = self.call('POST', '/api/user-data/events/<assessment_id>/token',
+                          f'/api/user-data/events/{assessment_id}/token', headers=self.user)
+        self.call('GET', '/api/user-data/events/<assessment_id>', f'/api/user-data/events/{assessment_id}',
+                  query_string={'token': token.get_json()['token']})
+        self.call('POST', '/api/user-data/progress/rebuild', '/api/user-data/progress/rebuild',
+                  json={'assessment_id': assessment_id}, headers=self.admin)
+        self.call('POST', '/api/user-data/uploads/sweep', '/api/user-data/uploads/sweep',
+                  json={'grace_seconds': 0}, headers=self.admin)
+        self.call('GET', '/api/user-data/report/<assessment_id>/export',
+                  f'/api/user-data/report/{assessment_id}/export', headers=self.admin)
+        self.call('GET', '/api/user-data/report/export', '/api/user-data/report/export?fiscal_year=2567',
+                  headers=self.admin)
+
+        return self.counts
+
+def measure(sizes, database_url=None):
+    """Generate a dataset of the given sizes in a fresh database and count each route's statements"""
+    from app import create_app
+    from database import db
+
+    workdir = tempfile.mkdtemp(prefix='bkn1-budget-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url or f'sqlite:///{workdir}/budget.db',
+        'UPLOAD_FOLDER': f'{workdir}/uploads',
+        'UPLOAD_SWEEP_INTERVAL': 0,
+        'EVENTS_STREAM_SECONDS': 0
+    })
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        dataset = generate_dataset(sizes)
+
+    try:
+        return BudgetRun(app, dataset, sizes).run()
+    finally:
+        executor = app.extensions.get('image_executor')
+        if executor:
+            executor.shutdown(wait=True)
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+def route_keys(app):
+    """(method, rule) of every route in the guarded blueprints"""
+    keys = set()
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint.split('.')[0] in BLUEPRINTS:
+            keys.update((method, rule.rule) for method in rule.methods - {'HEAD', 'OPTIONS'})
+    return keys
+
+def check(small, large, routes):
+    """Return a list of budget violations"""
+    failures = [f'{method} {rule}: no query budget case' for method, rule in sorted(routes - set(large))]
+
+    for key in sorted(large):
+        method, rule = key
+        budget = BUDGETS.get(key)
+        if budget is None:
+            failures.append(f'{method} {rule}: no budget declared')
+        elif large[key] > budget:
+            failures.append(f'{method} {rule}: {large[key]} statements, budget {budget}')
+        if large[key] > small.get(key, 0):
+            failures.append(f'{method} {rule}: grows with data size ({small.get(key)} -> {large[key]} statements)')
+
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check SQL statement budgets per route.')
+    parser.add_argument('--database-url', help='Database to use for both runs; all tables are dropped')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    routes = route_keys(create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'UPLOAD_SWEEP_INTERVAL': 0}))
+
+    small = measure(SMALL, args.database_url)
+    large = measure(LARGE, args.database_url)
+
+    for key in sorted(large):
+        method, rule = key
+        print(f'{method:<7}{rule:<48}{small.get(key, "-"):>4}{large[key]:>4}  / {BUDGETS.get(key, "-")}')
+
+    failures = check(small, large, routes)
+    if failures:
+        print('\nQuery budget check failed:\n  ' + '\n  '.join(failures))
+        sys.exit(1)
+
+    print('\nAll routes within their query budgets')
+
+if __name__ == '__main__':
+    main()
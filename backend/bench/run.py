@@ -0,0 +1,354 @@
+"""Benchmark the API hot paths against a synthetic dataset
+
+Run from the backend directory:
+
+    python -m bench.run --output before.json
+    python -m bench.run --users 500 --items 10 --output after.json --compare before.json
+
+Uses a temporary SQLite database unless --database-url points elsewhere. A
+Postgres database must be empty, or pass --reset to drop and recreate the tables.
+"""
+from bench.dataset import BENCH_PASSWORD, DEFAULT_SIZES, generate_dataset
+from datetime import datetime, timezone
+from sqlalchemy import event
+import argparse
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = [
+    'login',
+    'assessment_fetch',
+    'assessment_fetch_304',
+    'assessment_user_data',
+    'save_user_data',
+    'batch_save',
+    'upload_image',
+    'report_user',
+    'report_admin'
+]
+
+def percentile(sorted_values, fraction):
+    """Linearly interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def summarize(latencies, queries, errors, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'iterations': count,
+        'errors': errors,
+        'total_seconds': round(elapsed, 4),
+        'throughput_rps': round(count / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / count * 1000, 3) if count else None,
+            'p50': round(percentile(latencies, 0.50) * 1000, 3) if count else None,
+            'p90': round(percentile(latencies, 0.90) * 1000, 3) if count else None,
+            'p95': round(percentile(latencies, 0.95) * 1000, 3) if count else None,
+            'p99': round(percentile(latencies, 0.99) * 1000, 3) if count else None,
+            'max': round(latencies[-1] * 1000, 3) if count else None
+        },
+        'queries': {
+            'mean': round(sum(queries) / count, 2) if count else None,
+            'max': max(queries) if count else None
+        }
+    }
+
+class QueryCounter:
+    """Counts statements sent through the app's engine"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+class Bench:
+    def __init__(self, app, dataset, iterations, warmup, batch_size, seed, user_pool):
+        self.app = app
+        self.client = app.test_client()
+        self.dataset = dataset
+        self.iterations = iterations
+        self.warmup = warmup
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.tokens = {}
+        # A bounded pool keeps token setup cheap on large datasets
+        self.usernames = sorted(dataset['assignments'])[:user_pool]
+
+        from database import db
+        with app.app_context():
+            self.queries = QueryCounter(db.engine)
+
+    def headers(self, username):
+        if username not in self.tokens:
+            response = self.client.post('/api/auth/login', json={'username': username, 'password': BENCH_PASSWORD})
+            self.tokens[username] = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+        return self.tokens[username]
+
+    def random_user(self):
+        return self.rng.choice(self.usernames)
+
+    def measure(self, request):
+        """Run request() warmup + iterations times, timing each call and counting its queries"""
+        for _ in range(self.warmup):
+            request()
+
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+
+        for _ in range(self.iterations):
+            before = self.queries.count
+            call_started = time.perf_counter()
+            response = request()
+            latencies.append(time.perf_counter() - call_started)
+            queries.append(self.queries.count - before)
+            if response.status_code >= 400:
+                errors += 1
+
+        return summarize(latencies, queries, errors, time.perf_counter() - started)
+
+    def run(self, scenarios):
+        # Log everybody in up front so token creation never lands in a timed loop
+        for username in self.usernames + [self.dataset['admin_username']]:
+            self.headers(username)
+
+        results = {}
+        for name in scenarios:
+            # Prepare outside the timed loop (tokens, ETags, payload pools)
+            request = getattr(self, f'scenario_{name}')()
+            results[name] = self.measure(request)
+            print_result(name, results[name])
+
+        executor = self.app.extensions.get('image_executor')
+        if executor:
+            executor.shutdown(wait=True)
+
+        return results
+
+    def scenario_login(self):
+        def request():
+            return self.client.post('/api/auth/login', json={'username': self.random_user(), 'password': BENCH_PASSWORD})
+        return request
+
+    def scenario_assessment_fetch(self):
+        url = f"/api/assessments/{self.dataset['assessment_id']}"
+
+        def request():
+            return self.client.get(url, headers=self.headers(self.random_user()))
+        return request
+
+    def scenario_assessment_fetch_304(self):
+        url = f"/api/assessments/{self.dataset['assessment_id']}"
+        headers = dict(self.headers(self.random_user()))
+        headers['If-None-Match'] = self.client.get(url, headers=headers).headers['ETag']
+
+        def request():
+            return self.client.get(url, headers=headers)
+        return request
+
+    def scenario_assessment_user_data(self):
+        url = f"/api/user-data/assessment/{self.dataset['assessment_id']}"
+
+        def request():
+            return self.client.get(url, headers=self.headers(self.random_user()))
+        return request
+
+    def scenario_save_user_data(self):
+        def request():
+            username = self.random_user()
+            indicator_item_id = self.rng.choice(self.dataset['assignments'][username])
+            return self.client.post(f'/api/user-data/{indicator_item_id}', json={
+                'performance': 'bench',
+                'rate': self.rng.randint(0, 100),
+                'score': self.rng.randint(0, 5),
+                'status': self.rng.choice(['draft', 'complete'])
+            }, headers=self.headers(username))
+        return request
+
+    def scenario_batch_save(self):
+        def request():
+            username = self.random_user()
+            assigned = self.dataset['assignments'][username]
+            items = [{
+                'indicator_item_id': indicator_item_id,
+                'performance': 'bench',
+                'rate': self.rng.randint(0, 100),
+                'score': self.rng.randint(0, 5),
+                'status': 'complete'
+            } for indicator_item_id in self.rng.sample(assigned, min(self.batch_size, len(assigned)))]
+            return self.client.post('/api/user-data/batch', json={'items': items}, headers=self.headers(username))
+        return request
+
+    def scenario_upload_image(self):
+        from PIL import Image
+
+        # A few distinct images, so both new and already stored content is exercised
+        images = []
+        for index in range(5):
+            buffer = io.BytesIO()
+            Image.new('RGB', (1600, 1200), (index * 50, 100, 150)).save(buffer, 'JPEG', quality=90)
+            images.append(buffer.getvalue())
+
+        def request():
+            username = self.random_user()
+            indicator_item_id = self.rng.choice(self.dataset['assignments'][username])
+            return self.client.post(
+                f'/api/user-data/{indicator_item_id}/upload',
+                data={'file': (io.BytesIO(self.rng.choice(images)), 'bench.jpg')},
+                headers=self.headers(username),
+                content_type='multipart/form-data'
+            )
+        return request
+
+    def scenario_report_user(self):
+        url = f"/api/user-data/report/{self.dataset['assessment_id']}"
+
+        def request():
+            return self.client.get(url, headers=self.headers(self.random_user()))
+        return request
+
+    def scenario_report_admin(self):
+        url = f"/api/user-data/report/{self.dataset['assessment_id']}"
+        headers = self.headers(self.dataset['admin_username'])
+
+        def request():
+            return self.client.get(url, headers=headers)
+        return request
+
+def print_result(name, result):
+    latency = result['latency_ms']
+    print(
+        f"{name:<22} p50 {latency['p50']:>9.2f} ms  p95 {latency['p95']:>9.2f} ms  "
+        f"{result['throughput_rps']:>8.1f} req/s  {result['queries']['mean']:>6.1f} queries  "
+        f"{result['errors']} errors"
+    )
+
+def compare(previous, current):
+    """Print p50/p95 latency and query count changes against an earlier run"""
+    print(f"\nCompared with {previous['meta'].get('commit') or 'previous run'}:")
+    for name, result in current['results'].items():
+        before = previous['results'].get(name)
+        if not before:
+            continue
+
+        changes = []
+        for label, old, new in (
+            ('p50', before['latency_ms']['p50'], result['latency_ms']['p50']),
+            ('p95', before['latency_ms']['p95'], result['latency_ms']['p95']),
+            ('queries', before['queries']['mean'], result['queries']['mean'])
+        ):
+            change = f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+            changes.append(f'{label} {old} -> {new} ({change})')
+        print(f"{name:<22} " + ', '.join(changes))
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the API hot paths against synthetic data.')
+    parser.add_argument('--database-url', help='SQLAlchemy URL; defaults to a temporary SQLite file')
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate all tables first')
+    parser.add_argument('--items', type=int, default=DEFAULT_SIZES['items'])
+    parser.add_argument('--indicators', type=int, default=DEFAULT_SIZES['indicators'], help='per item')
+    parser.add_argument('--indicator-items', type=int, default=DEFAULT_SIZES['indicator_items'], help='per indicator')
+    parser.add_argument('--users', type=int, default=DEFAULT_SIZES['users'])
+    parser.add_argument('--permissions', type=int, default=DEFAULT_SIZES['permissions'], help='users per indicator')
+    parser.add_argument('--fill', type=float, default=DEFAULT_SIZES['fill'], help='share of entries pre-filled')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--user-pool', type=int, default=20, help='users the scenarios act as')
+    parser.add_argument('--batch-size', type=int, default=20, help='items per batch_save request')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma separated subset to run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--compare', help='JSON from an earlier run to compare against')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix='bkn1-bench-')
+    database_url = args.database_url or f'sqlite:///{workdir}/bench.db'
+
+    from app import create_app
+    from database import db
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'UPLOAD_FOLDER': f'{workdir}/uploads',
+        'UPLOAD_SWEEP_INTERVAL': 0,
+        'SLOW_REQUEST_MS': 0
+    })
+    sizes = {
+        'items': args.items,
+        'indicators': args.indicators,
+        'indicator_items': args.indicator_items,
+        'users': args.users,
+        'permissions': args.permissions,
+        'fill': args.fill
+    }
+
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+
+        from app.models.user import User
+        if db.session.query(User.id).first():
+            sys.exit('Database is not empty; use an empty database or pass --reset')
+
+        started = time.perf_counter()
+        dataset = generate_dataset(sizes, seed=args.seed)
+        print(f"Generated {dataset['counts']} in {time.perf_counter() - started:.1f}s on {db.engine.dialect.name}\n")
+        dialect = db.engine.dialect.name
+
+    bench = Bench(app, dataset, args.iterations, args.warmup, args.batch_size, args.seed, args.user_pool)
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'database': dialect,
+            'python': platform.python_version(),
+            'sizes': sizes,
+            'counts': dataset['counts'],
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'batch_size': args.batch_size,
+            'user_pool': args.user_pool,
+            'seed': args.seed
+        },
+        'results': bench.run(scenarios)
+    }
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+        print(f'\nResults written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(json.load(previous), report)
+
+if __name__ == '__main__':
+    main()
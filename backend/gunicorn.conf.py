@@ -0,0 +1,42 @@
+import os
+import shutil
+
+# Gunicorn settings, overridable through environment variables.
+# Every worker process has its own SQLAlchemy pool, so the database sees up to
+# WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections from the API.
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Processes, and threads per process; threads share the worker's connection pool.
+# Every open /api/user-data/events stream holds one thread for up to
+# EVENTS_STREAM_SECONDS (it gives its database connection back). EVENTS_MAX_STREAMS
+# (default 4) caps them per process so the rest keep serving requests; report pages
+# past the cap poll for changes instead.
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+worker_class = 'gthread'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+# Workers write /metrics values to files here so any worker can report the totals
+# of all of them (prometheus_client multiprocess mode). Set before workers import the app.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/bkn1-metrics')
+
+def on_starting(server):
+    # Values of a previous run would be added to this one
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,97 @@
+"""Change polling for reports: GET /api/user-data/report/<assessment_id>/changes"""
+from bench.dataset import BENCH_PASSWORD, generate_dataset
+from bench.query_budget import SMALL
+from datetime import datetime, timedelta
+import pytest
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app
+    from database import db
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/changes.db',
+        'UPLOAD_FOLDER': f'{tmp_path}/uploads',
+        'UPLOAD_SWEEP_INTERVAL': 0
+    })
+    with app.app_context():
+        db.create_all()
+        app.dataset = generate_dataset(SMALL)
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    response = client.post('/api/auth/login', json={
+        'username': app.dataset['admin_username'], 'password': BENCH_PASSWORD
+    })
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {response.get_json()['access_token']}"
+    return client
+
+def user_data_ids(app):
+    from app.models.user_data import UserData
+    from database import db
+
+    with app.app_context():
+        return [id for (id,) in db.session.query(UserData.id).order_by(UserData.id)]
+
+def poll(client, assessment_id, cursor, **params):
+    response = client.get(f'/api/user-data/report/{assessment_id}/changes', query_string={'cursor': cursor, **params})
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_write_committed_after_poll_is_returned(app, client):
+    from app.models.user_data import UserData
+    from database import db
+
+    assessment_id = app.dataset['assessment_id']
+    cursor = client.get(f'/api/user-data/report/{assessment_id}').get_json()['cursor']
+    user_data_id = user_data_ids(app)[0]
+
+    with app.app_context():
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        # Stamped as if the transaction started well before the poll
+        connection.execute(db.update(UserData).where(UserData.id == user_data_id).values(
+            performance='late', updated_at=datetime.utcnow() - timedelta(hours=1)
+        ))
+
+        changes = poll(client, assessment_id, cursor)
+        assert changes['changes'] == []
+        assert changes['cursor'] != cursor
+
+        transaction.commit()
+        connection.close()
+
+    changes = poll(client, assessment_id, changes['cursor'])
+    assert [change['data']['id'] for change in changes['changes']] == [user_data_id]
+    assert changes['changes'][0]['data']['performance'] == 'late'
+
+def test_changes_are_paged(app, client):
+    from app.models.user_data import UserData
+    from database import db
+
+    assessment_id = app.dataset['assessment_id']
+    cursor = client.get(f'/api/user-data/report/{assessment_id}').get_json()['cursor']
+    changed = user_data_ids(app)[:3]
+
+    with app.app_context():
+        for user_data_id in changed:
+            db.session.execute(db.update(UserData).where(UserData.id == user_data_id).values(performance='paged'))
+        db.session.commit()
+
+    seen = []
+    while True:
+        changes = poll(client, assessment_id, cursor, limit=2)
+        seen += [change['data']['id'] for change in changes['changes']]
+        cursor = changes['cursor']
+        if not changes['has_more']:
+            break
+
+    assert sorted(seen) == sorted(changed)
+    assert poll(client, assessment_id, cursor)['changes'] == []
@@ -0,0 +1,21 @@
+"""SQL statement budgets per route (see bench/query_budget.py)"""
+from bench.query_budget import BUDGETS, LARGE, SMALL, measure, route_keys
+import pytest
+
+@pytest.fixture(scope='module')
+def counts():
+    return measure(SMALL), measure(LARGE)
+
+def test_every_route_has_a_budget():
+    from app import create_app
+
+    routes = route_keys(create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'UPLOAD_SWEEP_INTERVAL': 0}))
+    assert routes <= set(BUDGETS)
+
+@pytest.mark.parametrize('key', sorted(BUDGETS), ids=lambda key: ' '.join(key))
+def test_route_within_budget(counts, key):
+    small, large = counts
+
+    assert key in large, 'no query budget case'
+    assert large[key] <= BUDGETS[key]
+    assert large[key] <= small[key], 'statement count grows with data size'
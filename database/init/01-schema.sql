@@ -74,25 +74,75 @@ CREATE TABLE user_data (
     user_id UUID REFERENCES users(id),
     indicator_item_id UUID REFERENCES indicator_items(id) ON DELETE CASCADE,
     performance VARCHAR(500),
-    rate VARCHAR(100),
-    score VARCHAR(100),
+    rate NUMERIC,
+    score NUMERIC,
     image_path VARCHAR(500),
+    thumbnail_path VARCHAR(500),
+    web_path VARCHAR(500),
     status VARCHAR(20) NOT NULL CHECK (status IN ('draft', 'complete')),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    change_txid BIGINT NOT NULL DEFAULT 0,
     UNIQUE(user_id, indicator_item_id)
 );
 
+-- Deleted user data, recorded by trigger for change polling (see backend/app/utils/changes.py)
+CREATE TABLE user_data_deletions (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_data_id UUID NOT NULL,
+    user_id UUID,
+    indicator_item_id UUID NOT NULL,
+    assessment_id UUID NOT NULL REFERENCES assessments(id) ON DELETE CASCADE,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    change_txid BIGINT NOT NULL DEFAULT txid_current()
+);
+
+-- Progress counters (completion per assessment, indicator and user)
+CREATE TABLE progress_counters (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    assessment_id UUID NOT NULL REFERENCES assessments(id) ON DELETE CASCADE,
+    scope VARCHAR(20) NOT NULL CHECK (scope IN ('assessment', 'indicator', 'user')),
+    scope_id UUID NOT NULL,
+    expected INTEGER NOT NULL DEFAULT 0,
+    draft INTEGER NOT NULL DEFAULT 0,
+    complete INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(assessment_id, scope, scope_id)
+);
+
+-- Content-addressed uploads with reference counts (see backend/app/utils/storage.py)
+CREATE TABLE upload_blobs (
+    path VARCHAR(500) PRIMARY KEY,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Published assessment trees, gzip compressed JSON per tree version (see backend/app/utils/snapshots.py)
+CREATE TABLE assessment_snapshots (
+    assessment_id UUID PRIMARY KEY REFERENCES assessments(id) ON DELETE CASCADE,
+    version VARCHAR(64) NOT NULL,
+    document BYTEA NOT NULL,
+    compact_document BYTEA NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create indexes for better performance
-CREATE INDEX idx_assessments_fiscal_year ON assessments(fiscal_year);
-CREATE INDEX idx_assessments_status ON assessments(status);
+CREATE INDEX idx_assessments_fiscal_year ON assessments(fiscal_year, created_at, id);
+CREATE INDEX idx_assessments_status ON assessments(status, fiscal_year, created_at, id);
+CREATE INDEX idx_assessments_name_pattern ON assessments(name text_pattern_ops);
+CREATE INDEX idx_users_username_pattern ON users(username text_pattern_ops);
 CREATE INDEX idx_assessment_items_assessment_id ON assessment_items(assessment_id);
 CREATE INDEX idx_indicators_assessment_item_id ON indicators(assessment_item_id);
 CREATE INDEX idx_indicator_items_indicator_id ON indicator_items(indicator_id);
 CREATE INDEX idx_user_permissions_user_id ON user_permissions(user_id);
 CREATE INDEX idx_user_permissions_indicator_id ON user_permissions(indicator_id);
 CREATE INDEX idx_user_data_user_id ON user_data(user_id);
-CREATE INDEX idx_user_data_indicator_item_id ON user_data(indicator_item_id);
+CREATE INDEX idx_user_data_indicator_item_updated_at ON user_data(indicator_item_id, updated_at);
+CREATE INDEX idx_user_data_image_path ON user_data(image_path) WHERE image_path IS NOT NULL;
+CREATE INDEX idx_user_data_change_txid ON user_data(change_txid);
+CREATE INDEX idx_user_data_deletions_assessment_change ON user_data_deletions(assessment_id, change_txid);
+CREATE INDEX idx_upload_blobs_unreferenced ON upload_blobs(updated_at) WHERE ref_count <= 0;
 
 -- Create default admin user (password: admin123)
 INSERT INTO users (username, email, password_hash, role, full_name) VALUES 
@@ -117,4 +167,35 @@ CREATE TRIGGER update_assessments_updated_at BEFORE UPDATE ON assessments
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
 CREATE TRIGGER update_user_data_updated_at BEFORE UPDATE ON user_data
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
\ No newline at end of file
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Record the writing transaction; change polling resumes from the oldest one
+-- still running, so rows that commit late are not skipped
+CREATE OR REPLACE FUNCTION stamp_user_data_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.change_txid = txid_current();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER stamp_user_data_change BEFORE INSERT OR UPDATE ON user_data
+    FOR EACH ROW EXECUTE FUNCTION stamp_user_data_change();
+
+-- Record deleted user data for clients polling for changes. Rows deleted along
+-- with their indicator item are skipped; that shows up as a tree change instead.
+CREATE OR REPLACE FUNCTION record_user_data_deletion()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_data_deletions (user_data_id, user_id, indicator_item_id, assessment_id)
+    SELECT OLD.id, OLD.user_id, OLD.indicator_item_id, ai.assessment_id
+    FROM indicator_items ii
+    JOIN indicators i ON i.id = ii.indicator_id
+    JOIN assessment_items ai ON ai.id = i.assessment_item_id
+    WHERE ii.id = OLD.indicator_item_id;
+    RETURN OLD;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER record_user_data_deletion AFTER DELETE ON user_data
+    FOR EACH ROW EXECUTE FUNCTION record_user_data_deletion();
\ No newline at end of file
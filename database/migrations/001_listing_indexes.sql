@@ -0,0 +1,11 @@
+-- Keyset pagination and prefix search for assessment and user listings
+
+-- Extend the single column indexes with the keyset ordering columns
+DROP INDEX IF EXISTS idx_assessments_fiscal_year;
+DROP INDEX IF EXISTS idx_assessments_status;
+CREATE INDEX idx_assessments_fiscal_year ON assessments(fiscal_year, created_at, id);
+CREATE INDEX idx_assessments_status ON assessments(status, fiscal_year, created_at, id);
+
+-- Prefix (LIKE 'abc%') search
+CREATE INDEX IF NOT EXISTS idx_assessments_name_pattern ON assessments(name text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_username_pattern ON users(username text_pattern_ops);
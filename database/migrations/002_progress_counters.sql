@@ -0,0 +1,14 @@
+-- Incrementally maintained completion counters per assessment, indicator and user
+-- After applying, populate the counters with POST /api/user-data/progress/rebuild
+
+CREATE TABLE IF NOT EXISTS progress_counters (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    assessment_id UUID NOT NULL REFERENCES assessments(id) ON DELETE CASCADE,
+    scope VARCHAR(20) NOT NULL CHECK (scope IN ('assessment', 'indicator', 'user')),
+    scope_id UUID NOT NULL,
+    expected INTEGER NOT NULL DEFAULT 0,
+    draft INTEGER NOT NULL DEFAULT 0,
+    complete INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(assessment_id, scope, scope_id)
+);
@@ -0,0 +1,4 @@
+-- Thumbnail and web-size variants generated in the background for uploaded images
+
+ALTER TABLE user_data ADD COLUMN IF NOT EXISTS thumbnail_path VARCHAR(500);
+ALTER TABLE user_data ADD COLUMN IF NOT EXISTS web_path VARCHAR(500);
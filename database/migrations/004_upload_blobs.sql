@@ -0,0 +1,20 @@
+-- Reference counted, content-addressed upload storage
+-- Existing flat uploads are registered with their current reference counts;
+-- new uploads are stored under uploads/ab/cd/<sha256>.<ext>
+
+CREATE TABLE IF NOT EXISTS upload_blobs (
+    path VARCHAR(500) PRIMARY KEY,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_data_image_path ON user_data(image_path) WHERE image_path IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_upload_blobs_unreferenced ON upload_blobs(updated_at) WHERE ref_count <= 0;
+
+INSERT INTO upload_blobs (path, ref_count)
+SELECT image_path, COUNT(*)
+FROM user_data
+WHERE image_path IS NOT NULL
+GROUP BY image_path
+ON CONFLICT (path) DO NOTHING;
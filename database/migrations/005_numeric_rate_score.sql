@@ -0,0 +1,21 @@
+-- Store user_data.rate and score as numbers so reports can aggregate them in SQL.
+-- Values are trimmed and thousands separators removed; anything still not numeric
+-- is kept in user_data_text_backup and set to NULL.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS user_data_text_backup AS
+SELECT id, rate, score, CURRENT_TIMESTAMP AS backed_up_at
+FROM user_data
+WHERE (rate IS NOT NULL AND replace(btrim(rate), ',', '') !~ '^[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)$')
+   OR (score IS NOT NULL AND replace(btrim(score), ',', '') !~ '^[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)$');
+
+ALTER TABLE user_data
+    ALTER COLUMN rate TYPE NUMERIC USING CASE
+        WHEN replace(btrim(rate), ',', '') ~ '^[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)$' THEN replace(btrim(rate), ',', '')::NUMERIC
+    END,
+    ALTER COLUMN score TYPE NUMERIC USING CASE
+        WHEN replace(btrim(score), ',', '') ~ '^[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)$' THEN replace(btrim(score), ',', '')::NUMERIC
+    END;
+
+COMMIT;
@@ -0,0 +1,34 @@
+-- Change polling for reports: GET /api/user-data/report/<assessment_id>/changes
+-- Replaces the single-column indicator_item_id index with (indicator_item_id, updated_at)
+-- and records deleted user data in user_data_deletions
+
+CREATE INDEX IF NOT EXISTS idx_user_data_indicator_item_updated_at ON user_data(indicator_item_id, updated_at);
+DROP INDEX IF EXISTS idx_user_data_indicator_item_id;
+
+CREATE TABLE IF NOT EXISTS user_data_deletions (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_data_id UUID NOT NULL,
+    user_id UUID,
+    indicator_item_id UUID NOT NULL,
+    assessment_id UUID NOT NULL REFERENCES assessments(id) ON DELETE CASCADE,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_data_deletions_assessment ON user_data_deletions(assessment_id, deleted_at);
+
+CREATE OR REPLACE FUNCTION record_user_data_deletion()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_data_deletions (user_data_id, user_id, indicator_item_id, assessment_id)
+    SELECT OLD.id, OLD.user_id, OLD.indicator_item_id, ai.assessment_id
+    FROM indicator_items ii
+    JOIN indicators i ON i.id = ii.indicator_id
+    JOIN assessment_items ai ON ai.id = i.assessment_item_id
+    WHERE ii.id = OLD.indicator_item_id;
+    RETURN OLD;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS record_user_data_deletion ON user_data;
+CREATE TRIGGER record_user_data_deletion AFTER DELETE ON user_data
+    FOR EACH ROW EXECUTE FUNCTION record_user_data_deletion();
@@ -0,0 +1,11 @@
+-- Snapshots of published assessment trees, gzip compressed JSON per tree version
+-- Existing published assessments are served from the tree tables until they are
+-- published or edited again, which writes their snapshot
+
+CREATE TABLE IF NOT EXISTS assessment_snapshots (
+    assessment_id UUID PRIMARY KEY REFERENCES assessments(id) ON DELETE CASCADE,
+    version VARCHAR(64) NOT NULL,
+    document BYTEA NOT NULL,
+    compact_document BYTEA NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,29 @@
+-- Order change polling by writing transaction instead of updated_at
+-- updated_at is stamped when a transaction starts, so a row that committed after a
+-- poll could fall behind that poll's cursor. Every write now records txid_current()
+-- and cursors resume from the oldest transaction running when they were issued.
+-- Cursors handed out before this migration get 410, which makes clients reload the report.
+
+BEGIN;
+
+ALTER TABLE user_data ADD COLUMN IF NOT EXISTS change_txid BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE user_data_deletions ADD COLUMN IF NOT EXISTS change_txid BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE user_data_deletions ALTER COLUMN change_txid SET DEFAULT txid_current();
+
+CREATE OR REPLACE FUNCTION stamp_user_data_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.change_txid = txid_current();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS stamp_user_data_change ON user_data;
+CREATE TRIGGER stamp_user_data_change BEFORE INSERT OR UPDATE ON user_data
+    FOR EACH ROW EXECUTE FUNCTION stamp_user_data_change();
+
+CREATE INDEX IF NOT EXISTS idx_user_data_change_txid ON user_data(change_txid);
+CREATE INDEX IF NOT EXISTS idx_user_data_deletions_assessment_change ON user_data_deletions(assessment_id, change_txid);
+DROP INDEX IF EXISTS idx_user_data_deletions_assessment;
+
+COMMIT;
@@ -11,8 +11,8 @@ export const authService = {
     return response.data
   },
 
-  async getUsers() {
-    const response = await api.get('/auth/users')
+  async getUsers(params = {}) {
+    const response = await api.get('/auth/users', { params })
     return response.data
   },
 
@@ -23,13 +23,18 @@ export const authService = {
 }
 
 export const assessmentService = {
-  async getAssessments() {
-    const response = await api.get('/assessments')
+  async getAssessments(params = {}) {
+    const response = await api.get('/assessments', { params })
     return response.data
   },
 
   async getAssessment(id) {
-    const response = await api.get(`/assessments/${id}`)
+    const response = await api.get(`/assessments/${id}`, { params: { compact: 1 } })
+    return response.data
+  },
+
+  async getPermittedAssessment(id) {
+    const response = await api.get(`/assessments/${id}/permitted`, { params: { compact: 1 } })
     return response.data
   },
 
@@ -38,11 +43,46 @@ export const assessmentService = {
     return response.data
   },
 
+  async importAssessment(fiscalYear, file) {
+    const formData = new FormData()
+    formData.append('fiscal_year', fiscalYear)
+    formData.append('file', file)
+    const response = await api.post('/assessments/import', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data'
+      }
+    })
+    return response.data
+  },
+
+  async cloneAssessment(id, fiscalYear, includePermissions) {
+    const response = await api.post(`/assessments/${id}/clone`, {
+      fiscal_year: fiscalYear,
+      include_permissions: includePermissions
+    })
+    return response.data
+  },
+
   async updateAssessment(id, assessment) {
     const response = await api.put(`/assessments/${id}`, assessment)
     return response.data
   },
 
+  async patchAssessment(id, operations) {
+    const response = await api.patch(`/assessments/${id}`, { operations })
+    return response.data
+  },
+
+  async getPermissionMatrix(id) {
+    const response = await api.get(`/assessments/${id}/permissions`)
+    return response.data
+  },
+
+  async updatePermissions(id, permissions) {
+    const response = await api.put(`/assessments/${id}/permissions`, { permissions })
+    return response.data
+  },
+
   async deleteAssessment(id) {
     const response = await api.delete(`/assessments/${id}`)
     return response.data
@@ -60,11 +100,21 @@ export const userDataService = {
     return response.data
   },
 
+  async getAssessmentUserData(assessmentId) {
+    const response = await api.get(`/user-data/assessment/${assessmentId}`, { params: { compact: 1 } })
+    return response.data
+  },
+
   async saveUserData(indicatorItemId, data) {
     const response = await api.post(`/user-data/${indicatorItemId}`, data)
     return response.data
   },
 
+  async saveUserDataBatch(items) {
+    const response = await api.post('/user-data/batch', { items })
+    return response.data
+  },
+
   async uploadImage(indicatorItemId, file) {
     const formData = new FormData()
     formData.append('file', file)
@@ -77,7 +127,37 @@ export const userDataService = {
   },
 
   async getAssessmentReport(assessmentId) {
-    const response = await api.get(`/user-data/report/${assessmentId}`)
+    const response = await api.get(`/user-data/report/${assessmentId}`, { params: { compact: 1 } })
+    return response.data
+  },
+
+  async getReportChanges(assessmentId, cursor) {
+    const response = await api.get(`/user-data/report/${assessmentId}/changes`, {
+      params: { cursor, compact: 1 }
+    })
+    return response.data
+  },
+
+  async openAssessmentEvents(assessmentId) {
+    // EventSource cannot send headers, so a short-lived token for this stream goes in
+    // the query string instead of the session token
+    const response = await api.post(`/user-data/events/${assessmentId}/token`)
+    const token = encodeURIComponent(response.data.token)
+    return new EventSource(`${api.defaults.baseURL}/user-data/events/${assessmentId}?token=${token}`)
+  },
+
+  async getAssessmentProgress(assessmentId, scope) {
+    const response = await api.get(`/user-data/progress/${assessmentId}`, {
+      params: scope ? { scope } : {}
+    })
+    return response.data
+  },
+
+  async exportAssessmentReport(assessmentId, format = 'csv') {
+    const response = await api.get(`/user-data/report/${assessmentId}/export`, {
+      params: { format },
+      responseType: 'blob'
+    })
     return response.data
   }
 }
\ No newline at end of file
@@ -3,6 +3,8 @@ import { assessmentService, userDataService } from '@/services'
 const state = {
   assessments: [],
   currentAssessment: null,
+  nextCursor: null,
+  filters: {},
   loading: false
 }
 
@@ -13,6 +15,13 @@ const mutations = {
   SET_ASSESSMENTS(state, assessments) {
     state.assessments = assessments
   },
+  APPEND_ASSESSMENTS(state, assessments) {
+    state.assessments.push(...assessments)
+  },
+  SET_PAGINATION(state, { nextCursor, filters }) {
+    state.nextCursor = nextCursor
+    state.filters = filters
+  },
   SET_CURRENT_ASSESSMENT(state, assessment) {
     state.currentAssessment = assessment
   },
@@ -31,11 +40,27 @@ const mutations = {
 }
 
 const actions = {
-  async fetchAssessments({ commit }) {
+  async fetchAssessments({ commit }, filters = {}) {
     commit('SET_LOADING', true)
     try {
-      const response = await assessmentService.getAssessments()
+      const response = await assessmentService.getAssessments(filters)
       commit('SET_ASSESSMENTS', response.assessments)
+      commit('SET_PAGINATION', { nextCursor: response.next_cursor, filters })
+      return response
+    } catch (error) {
+      throw error
+    } finally {
+      commit('SET_LOADING', false)
+    }
+  },
+
+  async fetchMoreAssessments({ commit, state }) {
+    if (!state.nextCursor) return
+    commit('SET_LOADING', true)
+    try {
+      const response = await assessmentService.getAssessments({ ...state.filters, cursor: state.nextCursor })
+      commit('APPEND_ASSESSMENTS', response.assessments)
+      commit('SET_PAGINATION', { nextCursor: response.next_cursor, filters: state.filters })
       return response
     } catch (error) {
       throw error
@@ -57,6 +82,19 @@ const actions = {
     }
   },
 
+  async fetchPermittedAssessment({ commit }, id) {
+    commit('SET_LOADING', true)
+    try {
+      const response = await assessmentService.getPermittedAssessment(id)
+      commit('SET_CURRENT_ASSESSMENT', response.assessment)
+      return response
+    } catch (error) {
+      throw error
+    } finally {
+      commit('SET_LOADING', false)
+    }
+  },
+
   async createAssessment({ commit }, assessment) {
     try {
       const response = await assessmentService.createAssessment(assessment)
@@ -67,6 +105,16 @@ const actions = {
     }
   },
 
+  async cloneAssessment({ commit }, { id, fiscalYear, includePermissions }) {
+    try {
+      const response = await assessmentService.cloneAssessment(id, fiscalYear, includePermissions)
+      commit('ADD_ASSESSMENT', response.assessment)
+      return response
+    } catch (error) {
+      throw error
+    }
+  },
+
   async updateAssessment({ commit }, { id, assessment }) {
     try {
       const response = await assessmentService.updateAssessment(id, assessment)
@@ -77,6 +125,24 @@ const actions = {
     }
   },
 
+  async patchAssessment({ commit }, { id, operations }) {
+    try {
+      const response = await assessmentService.patchAssessment(id, operations)
+      commit('UPDATE_ASSESSMENT', response.assessment)
+      return response
+    } catch (error) {
+      throw error
+    }
+  },
+
+  async updatePermissions(_, { id, permissions }) {
+    try {
+      return await assessmentService.updatePermissions(id, permissions)
+    } catch (error) {
+      throw error
+    }
+  },
+
   async deleteAssessment({ commit }, id) {
     try {
       await assessmentService.deleteAssessment(id)
@@ -101,6 +167,7 @@ const getters = {
   assessments: state => state.assessments,
   currentAssessment: state => state.currentAssessment,
   loading: state => state.loading,
+  hasMoreAssessments: state => !!state.nextCursor,
   draftAssessments: state => state.assessments.filter(a => a.status === 'draft'),
   publishedAssessments: state => state.assessments.filter(a => a.status === 'published')
 }